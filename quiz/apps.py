@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class QuizConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quiz'
+
+    def ready(self):
+        # Registers the signal handlers that generate image variants and invalidate
+        # compiled test content (quiz_cache imports images first)
+        from . import quiz_cache  # noqa: F401
+        # ... and the ones that keep the question search index in sync
+        from . import search  # noqa: F401
+
@@ -0,0 +1,15 @@
+"""
+Helpers for processing rows in fixed-size batches, shared by the streaming import,
+export and item analysis code.
+"""
+from itertools import islice
+
+
+def chunks(rows, chunk_size):
+    """ Yields lists of up to chunk_size rows from any iterable, reading only one list ahead """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,171 @@
+"""
+Streaming exports of question banks, test attempts and answers as CSV or JSON Lines.
+
+Each export is a generator of text lines fed by QuerySet.iterator(chunk_size=...), so rows
+are fetched from a server-side cursor (PostgreSQL) or in fetchmany() batches (SQLite) and
+written out as they arrive: neither the rows nor the output are ever held in memory, and
+the web view can start sending before the query has finished.
+
+Datasets:
+- questions: the question bank, in the layout quiz.importers reads back
+- attempts: one row per TestAttempt
+- answers: one row per UserAnswer, with the selected answer IDs decoded from
+  selected_mask (or read from the legacy selected_answers table)
+"""
+import csv
+import json
+
+from django.db.models import Count, Max, Prefetch
+from django.db.models.functions import Coalesce
+
+from .batching import chunks
+from .models import Answer, Question, TestAttempt, UserAnswer
+
+FORMATS = ('csv', 'jsonl')
+DATASETS = ('questions', 'attempts', 'answers')
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """ File-like object for csv.writer that returns each row instead of buffering it """
+
+    def write(self, value):
+        return value
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+# --- Row sources: yield one dict per exported row ---
+
+def question_rows(test_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yields dicts {id, test_id, text, explanation, answers: [{text, is_correct}]} in ID order """
+    questions = Question.objects.order_by('id').only('id', 'test_id', 'text', 'explanation').prefetch_related(
+        Prefetch('answers', queryset=Answer.objects.order_by('slot').only('id', 'question_id', 'text', 'is_correct'))
+    )
+    if test_ids:
+        questions = questions.filter(test_id__in=test_ids)
+    # With chunk_size, iterator() runs the answers prefetch once per chunk of questions
+    for question in questions.iterator(chunk_size=chunk_size):
+        yield {
+            'id': question.id,
+            'test_id': question.test_id,
+            'text': question.text,
+            'explanation': question.explanation,
+            'answers': [{'text': answer.text, 'is_correct': answer.is_correct} for answer in question.answers.all()],
+        }
+
+
+def attempt_rows(test_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yields one dict per TestAttempt in ID order """
+    attempts = TestAttempt.objects.order_by('id').values_list(
+        'id', 'user_id', 'user__username', 'test_id', 'test__name', 'start_time', 'end_time', 'completed', 'score'
+    )
+    if test_ids:
+        attempts = attempts.filter(test_id__in=test_ids)
+    for attempt_id, user_id, username, test_id, test_name, start_time, end_time, completed, score in attempts.iterator(chunk_size=chunk_size):
+        yield {
+            'id': attempt_id,
+            'user_id': user_id,
+            'username': username,
+            'test_id': test_id,
+            'test': test_name,
+            'start_time': _isoformat(start_time),
+            'end_time': _isoformat(end_time),
+            'completed': completed,
+            'score': score,
+        }
+
+
+def answer_rows(test_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields one dict per UserAnswer in ID order, with the selected answer IDs.
+    Masks are decoded with the answer slots of the chunk's questions (one extra query per
+    chunk), and legacy M2M selections are read for the chunk's legacy rows (one more).
+    """
+    answers = UserAnswer.objects.order_by('id').annotate(mask=Coalesce('selected_mask', -1)).values_list(
+        'id', 'test_attempt_id', 'test_attempt__user_id', 'test_attempt__test_id', 'question_id', 'is_correct', 'mask'
+    )
+    if test_ids:
+        answers = answers.filter(test_attempt__test_id__in=test_ids)
+
+    for chunk in chunks(answers.iterator(chunk_size=chunk_size), chunk_size):
+        slots = {}
+        for question_id, slot, answer_id in Answer.objects.filter(question_id__in={row[4] for row in chunk}).values_list('question_id', 'slot', 'id'):
+            slots.setdefault(question_id, {})[slot] = answer_id
+        legacy = {}
+        legacy_ids = [row[0] for row in chunk if row[6] < 0]
+        if legacy_ids:
+            through = UserAnswer.selected_answers.through.objects.filter(useranswer_id__in=legacy_ids)
+            for user_answer_id, answer_id in through.order_by('answer_id').values_list('useranswer_id', 'answer_id'):
+                legacy.setdefault(user_answer_id, []).append(answer_id)
+
+        for user_answer_id, attempt_id, user_id, test_id, question_id, is_correct, mask in chunk:
+            if mask < 0:
+                selected = legacy.get(user_answer_id, [])
+            else:
+                question_slots = slots.get(question_id, {})
+                selected = [question_slots[slot] for slot in sorted(question_slots) if mask >> slot & 1]
+            yield {
+                'id': user_answer_id,
+                'attempt_id': attempt_id,
+                'user_id': user_id,
+                'test_id': test_id,
+                'question_id': question_id,
+                'is_correct': is_correct,
+                'selected_answer_ids': selected,
+            }
+
+
+ROW_SOURCES = {'questions': question_rows, 'attempts': attempt_rows, 'answers': answer_rows}
+
+CSV_COLUMNS = {
+    'attempts': ['id', 'user_id', 'username', 'test_id', 'test', 'start_time', 'end_time', 'completed', 'score'],
+    'answers': ['id', 'attempt_id', 'user_id', 'test_id', 'question_id', 'is_correct', 'selected_answer_ids'],
+}
+
+
+# --- Serializers: yield text lines ---
+
+def _question_csv(rows, test_ids=None):
+    """ Questions as CSV in the importer's layout, with as many answer columns as the longest question needs """
+    answers = Answer.objects.all()
+    if test_ids:
+        answers = answers.filter(question__test_id__in=test_ids)
+    answer_columns = answers.values('question_id').annotate(count=Count('id')).aggregate(longest=Max('count'))['longest'] or 0
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['id', 'test_id', 'question', 'explanation'] + [f'answer{i}' for i in range(1, answer_columns + 1)] + ['correct'])
+    for row in rows:
+        texts = [answer['text'] for answer in row['answers']]
+        texts += [''] * (answer_columns - len(texts))
+        correct = ';'.join(str(position) for position, answer in enumerate(row['answers'], start=1) if answer['is_correct'])
+        yield writer.writerow([row['id'], row['test_id'], row['text'], row['explanation']] + texts + [correct])
+
+
+def _csv(dataset, rows, test_ids=None):
+    if dataset == 'questions':
+        yield from _question_csv(rows, test_ids)
+        return
+    writer = csv.writer(_Echo())
+    columns = CSV_COLUMNS[dataset]
+    yield writer.writerow(columns)
+    for row in rows:
+        if 'selected_answer_ids' in row:
+            row['selected_answer_ids'] = ';'.join(str(answer_id) for answer_id in row['selected_answer_ids'])
+        yield writer.writerow([row[column] for column in columns])
+
+
+def _jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def export_lines(dataset, file_format, test_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Returns a generator of the text lines of an export """
+    rows = ROW_SOURCES[dataset](test_ids=test_ids, chunk_size=chunk_size)
+    if file_format == 'csv':
+        return _csv(dataset, rows, test_ids)
+    return _jsonl(rows)
@@ -3,6 +3,7 @@ from django.utils import timezone # Needed for UserBlockForm's clean method
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm # <--- IMPORT UserCreationForm here
 from django.contrib.auth.models import User # Required for UserCreationForm's Meta class
 from .models import Question, Answer, Test, UserProfile # Import UserProfile
+from .importers import FORMATS, detect_format
 
 
 # --- Custom Admin Forms ---
@@ -54,32 +55,68 @@ class TestForm(forms.ModelForm):
     """ Form for creating and editing Test objects """
     class Meta:
         model = Test
-        fields = ['name', 'description', 'test_type']
+        fields = ['name', 'description', 'test_type', 'delivery']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'input input-bordered w-full'}),
             'description': forms.Textarea(attrs={'rows': 4, 'class': 'textarea textarea-bordered w-full'}),
             'test_type': forms.Select(attrs={'class': 'select select-bordered w-full max-w-xs'}),
+            'delivery': forms.Select(attrs={'class': 'select select-bordered w-full max-w-xs'}),
         }
         labels = {
             'name': 'Test Name',
             'description': 'Description',
             'test_type': 'Test Behavior Type',
+            'delivery': 'Exam Delivery',
         }
 
+class QuestionImportForm(forms.Form):
+    """ Upload form for the bulk question import (see quiz.importers) """
+    test = forms.ModelChoiceField(
+        queryset=Test.objects.all(),
+        widget=forms.Select(attrs={'class': 'select select-bordered w-full max-w-xs'}),
+        label='Import into Test',
+    )
+    file = forms.FileField(
+        widget=forms.FileInput(attrs={'class': 'file-input file-input-bordered w-full', 'accept': '.csv,.json,.jsonl,.ndjson,.gift,.txt'}),
+        label='Question File',
+    )
+    file_format = forms.ChoiceField(
+        choices=[('', 'Detect from file name')] + [(name, name.upper()) for name in FORMATS],
+        required=False,
+        widget=forms.Select(attrs={'class': 'select select-bordered w-full max-w-xs'}),
+        label='Format',
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'checkbox checkbox-primary'}),
+        label='Only validate (dry run)',
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('file')
+        if upload and not cleaned_data.get('file_format'):
+            file_format = detect_format(upload.name)
+            if file_format is None:
+                raise forms.ValidationError("Unknown file type; please choose the format.")
+            cleaned_data['file_format'] = file_format
+        return cleaned_data
+
 # --- Quiz Taking Form ---
 
 class UserAnswerForm(forms.Form):
-    selected_answers = forms.ModelMultipleChoiceField(
-        queryset=Answer.objects.none(), # Empty queryset initially
+    selected_answers = forms.TypedMultipleChoiceField(
+        coerce=int, # Cleaned data is a list of Answer IDs
+        choices=(), # Empty choices initially
         widget=forms.CheckboxSelectMultiple(), # Allows multiple selections
         required=False, # User might not select anything (considered incorrect)
     )
 
     def __init__(self, *args, **kwargs):
-        question = kwargs.pop('question') # Get the question object passed from the view
+        question = kwargs.pop('question') # Get the compiled question passed from the view
         super().__init__(*args, **kwargs)
-        # Set the queryset for the selected_answers field based on the question
-        self.fields['selected_answers'].queryset = question.answers.all()
+        # Set the choices from the compiled question, so building the form needs no queries
+        self.fields['selected_answers'].choices = [(answer.id, answer.text) for answer in question.answers]
         # Add DaisyUI classes to checkboxes
         self.fields['selected_answers'].widget.attrs.update({'class': 'checkbox checkbox-primary mr-2'})
 
@@ -0,0 +1,227 @@
+"""
+Set-based grading of test attempts.
+
+Instead of querying each question's answer and correct keys one by one, the whole
+attempt is loaded with a single query, compared in memory against the correct
+answer masks from the compiled test, and only the UserAnswer rows whose correctness
+changed are written back with one bulk_update.
+
+Answers recorded as UserAnswer.selected_mask are graded with an integer comparison;
+legacy answers stored in the selected_answers M2M table are compared as ID sets.
+
+record_answer and record_answers are the write side: they store selections with the
+fewest statements.
+"""
+from django.db import IntegrityError, connection, transaction
+
+from .models import UserAnswer
+
+
+def record_answer(attempt, question_id, selected_mask, is_correct=False):
+    """
+    Stores the user's selection for one question of an attempt and returns the UserAnswer.
+    A first answer is a single INSERT, a changed answer a single UPDATE, and resubmitting
+    the same selection writes nothing.
+    """
+    return _record_answer(attempt, question_id, selected_mask, is_correct, retry=True)
+
+
+def _answered(attempt, question_ids):
+    """ True if any of question_ids has a UserAnswer in attempt, i.e. an insert failed on the unique constraint """
+    return UserAnswer.objects.filter(test_attempt=attempt, question_id__in=question_ids).exists()
+
+
+def _record_answer(attempt, question_id, selected_mask, is_correct, retry):
+    user_answer = UserAnswer.objects.filter(test_attempt=attempt, question_id=question_id).only(
+        'id', 'test_attempt_id', 'question_id', 'selected_mask', 'is_correct'
+    ).first()
+
+    if user_answer is None:
+        try:
+            with transaction.atomic():
+                return UserAnswer.objects.create(
+                    test_attempt=attempt, question_id=question_id, selected_mask=selected_mask, is_correct=is_correct
+                )
+        except IntegrityError:
+            # A concurrent submission (double click, second tab) inserted this answer first: update it
+            # instead, once. Anything else, such as a question deleted meanwhile, is not retried.
+            if not retry or not _answered(attempt, [question_id]):
+                raise
+            return _record_answer(attempt, question_id, selected_mask, is_correct, retry=False)
+
+    if user_answer.selected_mask == selected_mask and user_answer.is_correct == is_correct:
+        return user_answer
+
+    if user_answer.selected_mask is None:
+        # Legacy answer: drop its M2M rows now that the selection lives in selected_mask
+        with transaction.atomic():
+            user_answer.selected_answers.clear()
+            UserAnswer.objects.filter(id=user_answer.id).update(selected_mask=selected_mask, is_correct=is_correct)
+    else:
+        UserAnswer.objects.filter(id=user_answer.id).update(selected_mask=selected_mask, is_correct=is_correct)
+    user_answer.selected_mask = selected_mask
+    user_answer.is_correct = is_correct
+    return user_answer
+
+
+def record_answers(attempt, compiled_test, selected_ids_by_question):
+    """
+    Stores a batch of selections {question_id: [answer_ids]} for an attempt, as submitted
+    by single-page exam mode: one read, then one upsert of the new and changed answers
+    (at most one bulk INSERT and one bulk UPDATE on backends without INSERT ... ON CONFLICT).
+    is_correct is filled in at the same time, so grading afterwards has nothing to rewrite.
+    Questions outside the attempt and answer IDs that don't belong to their question are ignored.
+    """
+    return _record_answers(attempt, compiled_test, selected_ids_by_question, retry=True)
+
+
+def _record_answers(attempt, compiled_test, selected_ids_by_question, retry):
+    attempt_question_ids = set(attempt.get_question_ids())
+    masks = {}
+    for question_id, answer_ids in selected_ids_by_question.items():
+        question = compiled_test.get_question(question_id)
+        if question is not None and question_id in attempt_question_ids:
+            masks[question_id] = question.mask_for_ids(answer_ids)
+
+    existing = {
+        user_answer.question_id: user_answer
+        for user_answer in UserAnswer.objects.filter(test_attempt=attempt, question_id__in=masks).only(
+            'id', 'test_attempt_id', 'question_id', 'selected_mask', 'is_correct'
+        )
+    }
+    to_create, to_update, legacy_ids = [], [], []
+    for question_id, selected_mask in masks.items():
+        is_correct = (selected_mask == compiled_test.get_question(question_id).correct_mask)
+        user_answer = existing.get(question_id)
+        if user_answer is None:
+            to_create.append(UserAnswer(
+                test_attempt=attempt, question_id=question_id, selected_mask=selected_mask, is_correct=is_correct
+            ))
+        elif user_answer.selected_mask != selected_mask or user_answer.is_correct != is_correct:
+            if user_answer.selected_mask is None:
+                legacy_ids.append(user_answer.id)
+            user_answer.selected_mask = selected_mask
+            user_answer.is_correct = is_correct
+            to_update.append(user_answer)
+
+    if connection.features.supports_update_conflicts_with_target:
+        # INSERT ... ON CONFLICT (test_attempt_id, question_id) DO UPDATE (PostgreSQL, SQLite):
+        # answers inserted concurrently since the read are simply overwritten
+        changed = [
+            UserAnswer(test_attempt=attempt, question_id=user_answer.question_id,
+                       selected_mask=user_answer.selected_mask, is_correct=user_answer.is_correct)
+            for user_answer in to_create + to_update
+        ]
+        with transaction.atomic():
+            if legacy_ids:
+                UserAnswer.selected_answers.through.objects.filter(useranswer_id__in=legacy_ids).delete()
+            if changed:
+                UserAnswer.objects.bulk_create(
+                    changed, update_conflicts=True,
+                    unique_fields=['test_attempt', 'question'], update_fields=['selected_mask', 'is_correct'],
+                )
+        return len(changed)
+
+    try:
+        with transaction.atomic():
+            if legacy_ids:
+                UserAnswer.selected_answers.through.objects.filter(useranswer_id__in=legacy_ids).delete()
+            if to_create:
+                UserAnswer.objects.bulk_create(to_create)
+            if to_update:
+                UserAnswer.objects.bulk_update(to_update, ['selected_mask', 'is_correct'])
+    except IntegrityError:
+        # Some of these questions were answered concurrently since the read: store them as updates, once
+        if not retry or not _answered(attempt, [user_answer.question_id for user_answer in to_create]):
+            raise
+        return _record_answers(attempt, compiled_test, selected_ids_by_question, retry=False)
+    return len(to_create) + len(to_update)
+
+
+def load_selections(attempt):
+    """
+    Returns {question_id: (user_answer, selection)} for an attempt, where selection is the
+    selected_mask, or the set of selected answer IDs for legacy M2M answers.
+    One query: the M2M join yields one row per legacy selected answer (or a single NULL row).
+    """
+    selections = {}
+    rows = UserAnswer.objects.filter(test_attempt=attempt).values_list(
+        'id', 'question_id', 'is_correct', 'selected_mask', 'selected_answers'
+    )
+    for user_answer_id, question_id, is_correct, selected_mask, answer_id in rows:
+        if question_id not in selections:
+            user_answer = UserAnswer(
+                id=user_answer_id, test_attempt_id=attempt.id, question_id=question_id,
+                is_correct=is_correct, selected_mask=selected_mask,
+            )
+            selections[question_id] = (user_answer, selected_mask if selected_mask is not None else set())
+        if answer_id is not None and selected_mask is None:
+            selections[question_id][1].add(answer_id)
+    return selections
+
+
+def is_selection_correct(question, selection):
+    """ User is correct only if their selected answers exactly match the correct ones """
+    if isinstance(selection, int):
+        return selection == question.correct_mask
+    return selection == question.correct_ids
+
+
+def grade_attempt(attempt, compiled_test, selections=None):
+    """
+    Grades every answer of attempt against compiled_test and stores UserAnswer.is_correct.
+    Returns (correct_count, total_questions); unanswered questions count as incorrect.
+    selections can be passed in when the caller already ran load_selections.
+    """
+    questions = compiled_test.questions_for_ids(attempt.get_question_ids())
+    if selections is None:
+        selections = load_selections(attempt)
+
+    correct_count = 0
+    changed = []
+    for question in questions:
+        if question.id not in selections:
+            continue
+        user_answer, selection = selections[question.id]
+        is_correct = is_selection_correct(question, selection)
+        if is_correct:
+            correct_count += 1
+        if user_answer.is_correct != is_correct:
+            user_answer.is_correct = is_correct
+            changed.append(user_answer)
+
+    if changed:
+        UserAnswer.objects.bulk_update(changed, ['is_correct'])
+    return correct_count, len(questions)
+
+
+def build_results_snapshot(attempt, compiled_test, selections=None):
+    """
+    Returns the JSON-serializable results of an attempt, as stored in TestAttempt.results_snapshot.
+    Each entry matches what test_results.html expects for one answered question.
+    """
+    if selections is None:
+        selections = load_selections(attempt)
+
+    results = []
+    for question in compiled_test.questions_for_ids(attempt.get_question_ids()):
+        if question.id not in selections:
+            continue
+        user_answer, selection = selections[question.id]
+        if isinstance(selection, int):
+            selected_answers = question.answers_for_mask(selection)
+        else:
+            selected_answers = question.answers_for_ids(selection)
+        results.append({
+            'question': {
+                'id': question.id,
+                'text': question.text,
+                'explanation': question.explanation,
+                'image_url': question.image_url,
+                'image': question.image,
+            },
+            'user_selected_answers': [{'id': answer.id, 'text': answer.text} for answer in selected_answers],
+            'correct_answers': [{'id': answer.id, 'text': answer.text} for answer in question.correct_answers],
+            'is_user_correct': is_selection_correct(question, selection),
+        })
+    return {'version': 1, 'results': results}
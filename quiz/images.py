@@ -0,0 +1,167 @@
+"""
+Responsive variants of question images, generated with Pillow when an image is uploaded.
+
+For every Question.image the pipeline stores, next to the original:
+- WebP and JPEG copies at each of VARIANT_WIDTHS that is narrower than the original
+  (plus one at the original width, capped at the largest of them)
+- a square WebP thumbnail for the admin lists
+
+Their names and sizes go into Question.image_variants:
+
+    {"source": "question_images/3f/3f9a...c2.png",
+     "webp": [[320, 180, "question_images/variants/a1/a1b4...07.webp"], ...],
+     "jpeg": [[320, 180, "question_images/variants/5d/5d0e...9b.jpg"], ...],
+     "thumbnail": [160, 160, "question_images/variants/c4/c47f...e1.webp"]}
+
+Templates render them as <picture> with srcset/sizes (see quiz/question_image.html), so the
+browser downloads the smallest file that fits instead of the multi-megabyte original.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps
+
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 960)
+THUMBNAIL_SIZE = 160
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+VARIANT_DIRECTORY = 'question_images/variants'
+
+
+def _flatten(image):
+    """ Returns an RGB copy of image, with any transparency composited onto white (for JPEG) """
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def variant_widths(original_width):
+    """ The widths to generate for an original of original_width pixels, smallest first """
+    widths = [width for width in VARIANT_WIDTHS if width < original_width]
+    widths.append(min(original_width, VARIANT_WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def build_variants(image_file):
+    """
+    Generates and saves the variants of an image FieldFile; returns (width, height, variants)
+    where width and height are the display size of the original after EXIF rotation.
+    """
+    storage = image_file.storage
+    stem = os.path.splitext(os.path.basename(image_file.name))[0]
+
+    with image_file.open('rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    width, height = image.size
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    webp_source = image.convert('RGBA' if has_alpha else 'RGB')
+    jpeg_source = _flatten(image)
+
+    variants = {'source': image_file.name, 'webp': [], 'jpeg': []}
+    for variant_width in variant_widths(width):
+        variant_height = max(1, round(height * variant_width / width))
+        size = (variant_width, variant_height)
+        for key, image_format, extension, source_image in (
+            ('webp', 'WEBP', 'webp', webp_source),
+            ('jpeg', 'JPEG', 'jpg', jpeg_source),
+        ):
+            resized = source_image if size == source_image.size else source_image.resize(size, Image.Resampling.LANCZOS)
+            name = storage.save(f'{VARIANT_DIRECTORY}/{stem}-{variant_width}w.{extension}', ContentFile(_encode(resized, image_format)))
+            variants[key].append([variant_width, variant_height, name])
+
+    thumbnail = ImageOps.fit(webp_source, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+    name = storage.save(f'{VARIANT_DIRECTORY}/{stem}-thumb.webp', ContentFile(_encode(thumbnail, 'WEBP')))
+    variants['thumbnail'] = [THUMBNAIL_SIZE, THUMBNAIL_SIZE, name]
+    return width, height, variants
+
+
+def refresh_question_image(question):
+    """
+    Regenerates the variants of question.image (or clears them when it has none) and stores
+    them with one UPDATE. An unreadable image is logged and served as the original only.
+    """
+    width = height = None
+    variants = {}
+    # With content-addressed storage an identical upload has the same name: reuse its variants
+    shared = None
+    if question.image:
+        shared = Question.objects.filter(image=question.image.name).exclude(id=question.id).exclude(
+            image_width__isnull=True
+        ).values_list('image_width', 'image_height', 'image_variants').first()
+    if shared and shared[2].get('source') == question.image.name and shared[2].get('jpeg'):
+        width, height, variants = shared
+    elif question.image:
+        try:
+            width, height, variants = build_variants(question.image)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.warning("Could not generate variants for question %s image %s", question.id, question.image.name, exc_info=True)
+            variants = {'source': question.image.name}
+    question.image_width, question.image_height, question.image_variants = width, height, variants
+    Question.objects.filter(id=question.id).update(image_width=width, image_height=height, image_variants=variants)
+
+
+def image_data(question):
+    """
+    Returns what templates need to render a question's image, or None if it has none:
+    {url, width, height, src, webp_srcset, jpeg_srcset, thumbnail_url}. Without variants
+    (not generated yet, or failed) only url is set and the original is shown.
+    """
+    if not question.image:
+        return None
+    storage = question.image.storage
+    data = {
+        'url': question.image.url,
+        'width': question.image_width,
+        'height': question.image_height,
+        'src': question.image.url,
+        'webp_srcset': '',
+        'jpeg_srcset': '',
+        'thumbnail_url': '',
+    }
+    variants = question.image_variants or {}
+    if variants.get('source') == question.image.name and variants.get('jpeg'):
+        largest_width, largest_height, _ = variants['jpeg'][-1]
+        data['width'], data['height'] = largest_width, largest_height
+        data['webp_srcset'] = ', '.join(f'{storage.url(name)} {width}w' for width, _, name in variants['webp'])
+        data['jpeg_srcset'] = ', '.join(f'{storage.url(name)} {width}w' for width, _, name in variants['jpeg'])
+        # Browsers without srcset support get the middle-sized JPEG
+        data['src'] = storage.url(variants['jpeg'][len(variants['jpeg']) // 2][2])
+        if variants.get('thumbnail'):
+            data['thumbnail_url'] = storage.url(variants['thumbnail'][2])
+    return data
+
+
+@receiver(post_save, sender=Question)
+def question_image_saved(sender, instance, raw=False, **kwargs):
+    """ Generates variants when a question's image was uploaded or replaced (or clears them) """
+    if raw:
+        return
+    source = (instance.image_variants or {}).get('source')
+    current = instance.image.name if instance.image else None
+    if source == current or (not current and not instance.image_variants):
+        return
+    # Runs before quiz_cache's receiver (see the import there), whose content_version bump
+    # then also covers the new variants
+    refresh_question_image(instance)
@@ -0,0 +1,468 @@
+"""
+Streaming bulk import of question banks.
+
+A file is parsed one record at a time, each record is validated on its own, and valid
+questions are written in chunks: one transaction per chunk with one bulk_create for
+the questions and one for their answers. Memory stays constant however large the file
+is, and an invalid record is reported with its line number without stopping the import.
+
+Supported formats (see the parse_* functions for details):
+- csv: a header row, then one question per row
+- json: a JSON array of question objects, or JSON Lines (one object per line)
+- gift: Moodle's GIFT text format (multiple choice and multiple response questions)
+
+bulk_create sends no signals, so the work of the usual receivers is repeated here once per
+chunk: correct_mask and answer slots are set directly, the search index is updated and the
+test's content_version is bumped.
+"""
+import csv
+import io
+import json
+import os
+import re
+
+from django.db import transaction
+
+from .batching import chunks
+from .models import Answer, Question, MAX_ANSWER_SLOT, answer_slots_to_mask
+from .quiz_cache import bump_content_version
+from .search import index_questions
+
+FORMATS = ('csv', 'json', 'gift')
+
+# Questions written per transaction
+DEFAULT_CHUNK_SIZE = 500
+# Errors kept for the report; later ones are only counted
+MAX_REPORTED_ERRORS = 200
+
+ANSWER_TEXT_MAX_LENGTH = Answer._meta.get_field('text').max_length
+
+
+class ImportRecordError(ValueError):
+    """ An invalid record in an import file """
+
+
+class QuestionRecord:
+    """ A parsed question: text, explanation and a list of (answer text, is_correct) """
+
+    __slots__ = ('line', 'text', 'explanation', 'answers')
+
+    def __init__(self, line, text, explanation='', answers=()):
+        self.line = line
+        self.text = (text or '').strip()
+        self.explanation = (explanation or '').strip()
+        self.answers = [(answer_text.strip(), bool(is_correct)) for answer_text, is_correct in answers]
+
+    def validate(self):
+        if not self.text:
+            raise ImportRecordError("Question text is empty.")
+        if len(self.answers) < 2:
+            raise ImportRecordError("A question needs at least 2 answers.")
+        if len(self.answers) > MAX_ANSWER_SLOT + 1:
+            raise ImportRecordError(f"A question cannot have more than {MAX_ANSWER_SLOT + 1} answers.")
+        for answer_text, _ in self.answers:
+            if not answer_text:
+                raise ImportRecordError("Answer text is empty.")
+            if len(answer_text) > ANSWER_TEXT_MAX_LENGTH:
+                raise ImportRecordError(f"Answer text is longer than {ANSWER_TEXT_MAX_LENGTH} characters.")
+        if not any(is_correct for _, is_correct in self.answers):
+            raise ImportRecordError("No answer is marked as correct.")
+
+
+class ImportResult:
+    """ Totals and per-record errors of an import """
+
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = [] # (line, message), the first MAX_REPORTED_ERRORS only
+        self.stopped = False # True when the rest of the file couldn't be read
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def stop(self, last_line, message):
+        """ Records an error that ends the import after last_line (0 if no record was read) """
+        self.stopped = True
+        self.error_count += 1
+        self.errors.append((None, f"Import stopped after line {last_line}: {message}" if last_line else f"Import stopped: {message}"))
+
+    @property
+    def errors_truncated(self):
+        return self.error_count > len(self.errors)
+
+
+# --- Parsers: each yields QuestionRecord, or ImportRecordError with a line number ---
+
+def _correct_positions(value, answer_count):
+    """ Parses a CSV "correct" cell such as "2", "1;3" or "A,C" into 0-based answer positions """
+    positions = set()
+    for token in re.split(r'[\s,;|]+', value.strip()):
+        if not token:
+            continue
+        if token.isdigit():
+            position = int(token) - 1
+        elif len(token) == 1 and token.isalpha():
+            position = ord(token.upper()) - ord('A')
+        else:
+            raise ImportRecordError(f"Invalid correct answer reference {token!r}.")
+        if not 0 <= position < answer_count:
+            raise ImportRecordError(f"Correct answer {token!r} does not exist.")
+        positions.add(position)
+    return positions
+
+
+def parse_csv(stream):
+    """
+    Columns (case-insensitive): `question` (or `text`), optional `explanation`, one column per
+    answer named `answer1`, `answer2`, ... (empty cells are skipped), and `correct` listing the
+    correct answers by number or letter, e.g. "2" or "A;C".
+    """
+    reader = csv.reader(stream)
+    try:
+        header = [name.strip().lower() for name in next(reader)]
+    except StopIteration:
+        return
+    if 'question' in header:
+        text_column = header.index('question')
+    elif 'text' in header:
+        text_column = header.index('text')
+    else:
+        yield ImportRecordError("Missing a `question` column."), 1
+        return
+    if 'correct' not in header:
+        yield ImportRecordError("Missing a `correct` column."), 1
+        return
+    correct_column = header.index('correct')
+    explanation_column = header.index('explanation') if 'explanation' in header else None
+    answer_columns = [index for index, name in enumerate(header) if re.fullmatch(r'answers?_?\d+', name)]
+
+    for row in reader:
+        line = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        row += [''] * (len(header) - len(row))
+        answers = [row[index] for index in answer_columns if row[index].strip()]
+        try:
+            correct = _correct_positions(row[correct_column], len(answers))
+        except ImportRecordError as error:
+            yield error, line
+            continue
+        yield QuestionRecord(
+            line,
+            row[text_column],
+            row[explanation_column] if explanation_column is not None else '',
+            [(answer, position in correct) for position, answer in enumerate(answers)],
+        ), line
+
+
+def _record_from_object(obj, line):
+    """ {"text": ..., "explanation": ..., "answers": [{"text": ..., "is_correct": true}, ...]} """
+    if not isinstance(obj, dict):
+        raise ImportRecordError("Expected a JSON object.")
+    answers = obj.get('answers')
+    if not isinstance(answers, list):
+        raise ImportRecordError("`answers` must be a list.")
+    parsed = []
+    for answer in answers:
+        if not isinstance(answer, dict) or not isinstance(answer.get('text'), str):
+            raise ImportRecordError("Each answer must be an object with a `text` string.")
+        parsed.append((answer['text'], answer.get('is_correct', False) is True))
+    text = obj.get('text', obj.get('question'))
+    if not isinstance(text, str):
+        raise ImportRecordError("`text` must be a string.")
+    explanation = obj.get('explanation') or ''
+    if not isinstance(explanation, str):
+        raise ImportRecordError("`explanation` must be a string.")
+    return QuestionRecord(line, text, explanation, parsed)
+
+
+def _iter_json_array(stream, buffer_size=65536):
+    """
+    Yields (object, line) for each element of a top-level JSON array, decoding one element
+    at a time from a bounded buffer instead of loading the whole document.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    line = 1
+    started = False
+    eof = False
+    while True:
+        stripped = buffer.lstrip()
+        line += buffer[:len(buffer) - len(stripped)].count('\n')
+        buffer = stripped
+        if not started:
+            if buffer:
+                if buffer[0] != '[':
+                    raise ImportRecordError("Expected a JSON array.")
+                buffer = buffer[1:]
+                started = True
+                continue
+        elif buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        elif buffer.startswith(']'):
+            return
+        elif buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ImportRecordError(f"Invalid JSON near line {line}.")
+            else:
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(buffer) or eof:
+                    yield obj, line
+                    line += buffer[:end].count('\n')
+                    buffer = buffer[end:]
+                    continue
+        if eof:
+            raise ImportRecordError("Unexpected end of the JSON array.")
+        chunk = stream.read(buffer_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def parse_json(stream):
+    """
+    Either a JSON array of question objects or JSON Lines (one object per line), each like
+    {"text": "...", "explanation": "...", "answers": [{"text": "...", "is_correct": true}, ...]}
+    """
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if not first:
+        return
+
+    if first == '[':
+        elements = _iter_json_array(_Prepend('[', stream))
+        while True:
+            try:
+                obj, line = next(elements)
+            except StopIteration:
+                return
+            except ImportRecordError as error:
+                # The rest of a malformed array cannot be located reliably
+                yield error, None
+                return
+            try:
+                yield _record_from_object(obj, line), line
+            except ImportRecordError as error:
+                yield error, line
+        return
+
+    for line, text in enumerate(_Prepend(first, stream), start=1):
+        if not text.strip():
+            continue
+        try:
+            yield _record_from_object(json.loads(text), line), line
+        except json.JSONDecodeError as error:
+            yield ImportRecordError(f"Invalid JSON: {error.msg}."), line
+        except ImportRecordError as error:
+            yield error, line
+
+
+class _Prepend:
+    """ A text stream with some already consumed characters put back in front """
+
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        prefix, self.prefix = self.prefix, ''
+        if size is None or size < 0:
+            return prefix + self.stream.read()
+        return prefix + self.stream.read(max(size - len(prefix), 0)) if size > len(prefix) else prefix
+
+    def __iter__(self):
+        first_line = self.prefix + self.stream.readline()
+        self.prefix = ''
+        if first_line:
+            yield first_line
+        yield from self.stream
+
+
+_GIFT_ESCAPES = {'\\:': ':', '\\~': '~', '\\=': '=', '\\#': '#', '\\{': '{', '\\}': '}', '\\n': '\n', '\\\\': '\\'}
+
+
+def _gift_unescape(text):
+    return re.sub(r'\\[:~=#{}n\\]', lambda match: _GIFT_ESCAPES[match.group(0)], text).strip()
+
+
+def _gift_split(text, separators):
+    """ Splits text before each unescaped separator character; returns [(separator, part)] """
+    parts = []
+    current, marker = [], ''
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == '\\' and index + 1 < len(text):
+            current.append(text[index:index + 2])
+            index += 2
+            continue
+        if char in separators:
+            parts.append((marker, ''.join(current)))
+            current, marker = [], char
+        else:
+            current.append(char)
+        index += 1
+    parts.append((marker, ''.join(current)))
+    return parts
+
+
+def _parse_gift_question(block, line):
+    body = block.strip()
+    title = re.match(r'::(.*?)::', body, re.S)
+    if title:
+        body = body[title.end():]
+    # Optional [html]/[markdown]/... text format prefix
+    body = re.sub(r'^\s*\[\w+\]', '', body)
+
+    open_brace = re.search(r'(?<!\\)\{', body)
+    close_brace = re.search(r'(?<!\\)\}\s*$', body)
+    if not open_brace or not close_brace or close_brace.start() < open_brace.start():
+        raise ImportRecordError("Expected an answer block in braces, e.g. {=right ~wrong}.")
+    text = _gift_unescape(body[:open_brace.start()])
+    answer_block = body[open_brace.end():close_brace.start()]
+
+    explanation = ''
+    general = re.split(r'(?<!\\)####', answer_block, maxsplit=1)
+    if len(general) == 2:
+        answer_block, explanation = general[0], _gift_unescape(general[1])
+
+    answers = []
+    for marker, part in _gift_split(answer_block, '=~'):
+        if not marker:
+            if part.strip():
+                raise ImportRecordError("Only multiple choice questions ({=right ~wrong}) can be imported.")
+            continue
+        # Per-answer feedback after # is not stored
+        part = _gift_split(part, '#')[0][1]
+        weight = re.match(r'\s*%(-?\d+(?:\.\d+)?)%', part)
+        if weight:
+            part = part[weight.end():]
+        is_correct = marker == '=' or (weight is not None and float(weight.group(1)) > 0)
+        answers.append((_gift_unescape(part), is_correct))
+    return QuestionRecord(line, text, explanation, answers)
+
+
+def parse_gift(stream):
+    """
+    Moodle GIFT: questions separated by blank lines, `//` comment lines, an optional
+    ::title::, and answers in braces: `=` marks a correct answer and `~` a wrong one, or
+    `~%50%` a weighted one (correct when the weight is positive). `####text` in the answer
+    block becomes the explanation. Other GIFT question types are reported as errors.
+    """
+    block, block_line = [], None
+    depth = 0
+    for line_number, line in enumerate(stream, start=1):
+        if not block and (not line.strip() or line.lstrip().startswith('//')):
+            continue
+        if line.lstrip().startswith('//'):
+            continue
+        if line.strip().startswith('$CATEGORY:'):
+            continue
+        if not line.strip() and depth == 0:
+            try:
+                yield _parse_gift_question(''.join(block), block_line), block_line
+            except ImportRecordError as error:
+                yield error, block_line
+            block, block_line = [], None
+            continue
+        if block_line is None:
+            block_line = line_number
+        block.append(line)
+        depth += len(re.findall(r'(?<!\\)\{', line)) - len(re.findall(r'(?<!\\)\}', line))
+    if block:
+        try:
+            yield _parse_gift_question(''.join(block), block_line), block_line
+        except ImportRecordError as error:
+            yield error, block_line
+
+
+PARSERS = {'csv': parse_csv, 'json': parse_json, 'gift': parse_gift}
+
+
+def detect_format(filename):
+    """ Guesses the import format from a file name; returns None when unknown """
+    extension = os.path.splitext(filename or '')[1].lower()
+    return {'.csv': 'csv', '.json': 'json', '.jsonl': 'json', '.ndjson': 'json', '.gift': 'gift', '.txt': 'gift'}.get(extension)
+
+
+def open_text(binary_file):
+    """ Wraps an uploaded or opened binary file for streaming text parsing (BOM-tolerant UTF-8) """
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+# --- Writer ---
+
+def _write_chunk(test, records):
+    """ Creates the questions and answers of one chunk of valid records; returns the new question IDs """
+    questions = [
+        Question(
+            test=test,
+            text=record.text,
+            explanation=record.explanation,
+            correct_mask=answer_slots_to_mask(slot for slot, (_, is_correct) in enumerate(record.answers) if is_correct),
+        )
+        for record in records
+    ]
+    with transaction.atomic():
+        Question.objects.bulk_create(questions)
+        Answer.objects.bulk_create(
+            Answer(question=question, text=answer_text, is_correct=is_correct, slot=slot)
+            for question, record in zip(questions, records)
+            for slot, (answer_text, is_correct) in enumerate(record.answers)
+        )
+        index_questions(question.id for question in questions)
+        # Bumped with every chunk, so the compiled test never lags behind questions already committed
+        # (an import that fails part way leaves its earlier chunks in place)
+        bump_content_version([test.id])
+    return [question.id for question in questions]
+
+
+def import_questions(stream, file_format, test, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, progress=None):
+    """
+    Imports the questions of a text stream in file_format into test and returns an ImportResult.
+    Each chunk of chunk_size valid questions is committed on its own, so an error in one
+    record (or a crash late in the file) never discards the chunks already written.
+    A file that can't be read as text (not UTF-8, or a malformed CSV) stops the import there:
+    the records before it are still imported and the problem is reported as an error.
+    With dry_run, records are only parsed and validated.
+    progress, if given, is called with the ImportResult after each chunk.
+    """
+    result = ImportResult()
+    records = PARSERS[file_format](stream)
+
+    def read_records():
+        line = 0
+        try:
+            for record, line in records:
+                yield record, line
+        except UnicodeDecodeError:
+            result.stop(line, "The file is not UTF-8 text. Save it as UTF-8 (\"CSV UTF-8\" in Excel) and import the rest again.")
+        except csv.Error as error:
+            result.stop(line, f"Malformed CSV ({error}).")
+
+    def valid_records():
+        for record, line in read_records():
+            if isinstance(record, ImportRecordError):
+                result.add_error(line, str(record))
+                continue
+            try:
+                record.validate()
+            except ImportRecordError as error:
+                result.add_error(line, str(error))
+                continue
+            yield record
+
+    for chunk in chunks(valid_records(), chunk_size):
+        if not dry_run:
+            _write_chunk(test, chunk)
+        result.created += len(chunk)
+        if progress:
+            progress(result)
+    return result
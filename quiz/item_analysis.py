@@ -0,0 +1,136 @@
+"""
+Bulk item analysis (difficulty, discrimination, answer selection frequencies) with NumPy.
+
+Answers of completed attempts are streamed from the database in fixed-size chunks and
+folded into per-question accumulator arrays, so memory depends on the number of
+attempts and questions of the test, never on the number of answer rows.
+
+Two passes are made over the answers of a test:
+1. total correct answers per attempt, to rank examinees into upper and lower groups
+2. per-question responses, correct counts (overall and per group) and answer slot selections
+
+Statistics only cover completed attempts, and only questions that still exist.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .batching import chunks
+from .models import Answer, Question, QuestionStatistics, TestAttempt, UserAnswer
+
+# Share of examinees in each of the upper and lower groups (Kelley's 27%)
+GROUP_FRACTION = 0.27
+
+
+def _index_of(sorted_ids, ids):
+    """ Maps ids onto positions in sorted_ids; returns (positions, mask of ids that were found) """
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    positions = np.searchsorted(sorted_ids, ids)
+    positions = np.minimum(positions, len(sorted_ids) - 1)
+    found = sorted_ids[positions] == ids
+    return positions, found
+
+
+def analyze_test(test, chunk_size=50000):
+    """
+    Computes QuestionStatistics for every question of a test and stores them.
+    Returns the number of questions analysed.
+    """
+    question_ids = np.fromiter(Question.objects.filter(test=test).order_by('id').values_list('id', flat=True), dtype=np.int64)
+    if not len(question_ids):
+        return 0
+    attempt_ids = np.fromiter(
+        TestAttempt.objects.filter(test=test, completed=True).order_by('id').values_list('id', flat=True), dtype=np.int64
+    )
+    num_questions = len(question_ids)
+
+    answer_slots = {}
+    for answer_id, question_id, slot in Answer.objects.filter(question__test=test).values_list('id', 'question_id', 'slot'):
+        answer_slots.setdefault(question_id, []).append((answer_id, slot))
+    num_slots = max((slot for slots in answer_slots.values() for _, slot in slots), default=0) + 1
+
+    answers = UserAnswer.objects.filter(test_attempt__test=test, test_attempt__completed=True)
+
+    # --- Pass 1: total correct answers per attempt ---
+    totals = np.zeros(len(attempt_ids), dtype=np.int64)
+    correct_rows = answers.filter(is_correct=True).values_list('test_attempt_id', flat=True).iterator(chunk_size=chunk_size)
+    for chunk in chunks(correct_rows, chunk_size):
+        positions, found = _index_of(attempt_ids, np.asarray(chunk, dtype=np.int64))
+        totals += np.bincount(positions[found], minlength=len(attempt_ids))
+
+    # Rank examinees: lowest and highest GROUP_FRACTION of totals (ties broken by attempt order)
+    group_size = max(1, int(round(len(attempt_ids) * GROUP_FRACTION))) if len(attempt_ids) else 0
+    upper = np.zeros(len(attempt_ids), dtype=bool)
+    lower = np.zeros(len(attempt_ids), dtype=bool)
+    if group_size:
+        order = np.argsort(totals, kind='stable')
+        lower[order[:group_size]] = True
+        upper[order[-group_size:]] = True
+
+    # --- Pass 2: per-question accumulators ---
+    responses = np.zeros(num_questions, dtype=np.int64)
+    correct = np.zeros(num_questions, dtype=np.int64)
+    upper_correct = np.zeros(num_questions, dtype=np.int64)
+    lower_correct = np.zeros(num_questions, dtype=np.int64)
+    slot_counts = np.zeros((num_questions, num_slots), dtype=np.int64)
+
+    # Legacy M2M answers have no mask; -1 keeps every column an integer so chunks convert directly
+    rows = answers.annotate(mask=Coalesce('selected_mask', -1)).values_list(
+        'test_attempt_id', 'question_id', 'is_correct', 'mask'
+    ).iterator(chunk_size=chunk_size)
+    for chunk in chunks(rows, chunk_size):
+        data = np.array(chunk, dtype=np.int64)
+        attempt_pos, attempt_found = _index_of(attempt_ids, data[:, 0])
+        question_pos, question_found = _index_of(question_ids, data[:, 1])
+        keep = attempt_found & question_found
+        attempt_pos, question_pos = attempt_pos[keep], question_pos[keep]
+        is_correct, masks = data[keep, 2], data[keep, 3]
+
+        responses += np.bincount(question_pos, minlength=num_questions)
+        correct += np.bincount(question_pos, weights=is_correct, minlength=num_questions).astype(np.int64)
+        in_upper, in_lower = upper[attempt_pos], lower[attempt_pos]
+        upper_correct += np.bincount(question_pos[in_upper], weights=is_correct[in_upper], minlength=num_questions).astype(np.int64)
+        lower_correct += np.bincount(question_pos[in_lower], weights=is_correct[in_lower], minlength=num_questions).astype(np.int64)
+
+        # Slot selections for answers stored as bitmasks (legacy M2M answers have mask -1)
+        has_mask = masks >= 0
+        for slot in range(num_slots):
+            selected = has_mask & ((masks >> slot) & 1).astype(bool)
+            if selected.any():
+                slot_counts[:, slot] += np.bincount(question_pos[selected], minlength=num_questions)
+
+    # Legacy selections still stored in the selected_answers M2M table
+    legacy = UserAnswer.selected_answers.through.objects.filter(
+        useranswer__test_attempt__test=test,
+        useranswer__test_attempt__completed=True,
+        useranswer__selected_mask__isnull=True,
+    ).values_list('useranswer__question_id', 'answer__slot')
+    for chunk in chunks(legacy.iterator(chunk_size=chunk_size), chunk_size):
+        data = np.asarray(chunk, dtype=np.int64)
+        question_pos, question_found = _index_of(question_ids, data[:, 0])
+        in_range = question_found & (data[:, 1] < num_slots)
+        np.add.at(slot_counts, (question_pos[in_range], data[in_range, 1]), 1)
+
+    # --- Statistics ---
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_values = np.where(responses > 0, correct / responses, np.nan)
+    discrimination = (upper_correct - lower_correct) / group_size if group_size else np.full(num_questions, np.nan)
+
+    now = timezone.now()
+    statistics = []
+    for index, question_id in enumerate(question_ids.tolist()):
+        statistics.append(QuestionStatistics(
+            question_id=question_id,
+            response_count=int(responses[index]),
+            p_value=None if np.isnan(p_values[index]) else float(p_values[index]),
+            discrimination=None if not responses[index] or np.isnan(discrimination[index]) else float(discrimination[index]),
+            selection_counts={str(answer_id): int(slot_counts[index, slot]) for answer_id, slot in answer_slots.get(question_id, [])},
+            computed_at=now,
+        ))
+
+    with transaction.atomic():
+        QuestionStatistics.objects.filter(question__test=test).delete()
+        QuestionStatistics.objects.bulk_create(statistics)
+    return len(statistics)
@@ -0,0 +1,90 @@
+"""
+Synthetic data helpers shared by the bench_* management commands.
+Benchmarks run inside a transaction that is rolled back, so nothing created here persists.
+"""
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+from quiz.models import Test, Question, Answer, TestAttempt, UserAnswer, UserProfile
+
+
+class Rollback(Exception):
+    """ Raised at the end of a benchmark to roll back its transaction """
+
+
+def create_synthetic_test(num_questions, answers_per_question=4, test_type='exam'):
+    test = Test.objects.create(name=f"Benchmark {num_questions}", test_type=test_type)
+    # The first answer of every question (slot 0) is the correct one
+    questions = Question.objects.bulk_create(
+        Question(test=test, text=f"Benchmark question {i}", explanation="Synthetic", correct_mask=1) for i in range(num_questions)
+    )
+    Answer.objects.bulk_create(
+        Answer(question=question, text=f"Choice {j}", is_correct=(j == 0), slot=j)
+        for question in questions
+        for j in range(answers_per_question)
+    )
+    return test
+
+
+def create_synthetic_user(prefix='bench'):
+    return User.objects.create(username=f"{prefix}_{random.getrandbits(48):x}")
+
+
+def bulk_create_users(users, blocked_until=None):
+    """
+    Saves unsaved User objects with bulk_create and returns them. bulk_create skips the post_save
+    signal that creates user profiles, so the profiles are created alongside; blocked_until(user),
+    if given, returns the profile's block end (or None).
+    """
+    users = User.objects.bulk_create(users)
+    UserProfile.objects.bulk_create(
+        UserProfile(user=user, blocked_until=blocked_until(user) if blocked_until else None) for user in users
+    )
+    return users
+
+
+def create_synthetic_attempt(test, user, correct_ratio=0.7, legacy=False):
+    """
+    Creates an in-progress attempt with every question answered.
+    Selections are stored as selected_mask, or as M2M rows when legacy is True.
+    """
+    attempt = TestAttempt.objects.create(user=user, test=test, question_ids=TestAttempt.snapshot_question_ids(test))
+    if not legacy:
+        UserAnswer.objects.bulk_create(
+            UserAnswer(test_attempt=attempt, question_id=question_id, selected_mask=1 if random.random() < correct_ratio else 8)
+            for question_id in attempt.question_ids
+        )
+        return attempt
+
+    answers_by_question = {}
+    for answer in Answer.objects.filter(question__test=test).order_by('id'):
+        answers_by_question.setdefault(answer.question_id, []).append(answer)
+
+    user_answers = UserAnswer.objects.bulk_create(
+        UserAnswer(test_attempt=attempt, question_id=question_id) for question_id in attempt.question_ids
+    )
+    through = UserAnswer.selected_answers.through
+    selections = []
+    for user_answer in user_answers:
+        answers = answers_by_question[user_answer.question_id]
+        chosen = answers[0] if random.random() < correct_ratio else answers[-1]
+        selections.append(through(useranswer_id=user_answer.id, answer_id=chosen.id))
+    through.objects.bulk_create(selections)
+    return attempt
+
+
+def measure(func, repeat=1):
+    """ Runs func repeat times; returns (queries of the last run, best wall time in ms, last result) """
+    best = None
+    for _ in range(repeat):
+        reset_queries() # The query log is capped, so start every run empty
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            result = func()
+            elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return len(ctx), best, result
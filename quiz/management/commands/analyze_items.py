@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.models import Test
+
+
+class Command(BaseCommand):
+    help = "Computes item statistics (difficulty, discrimination, answer selections) for question banks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, action='append', dest='test_ids', help="Only analyse this test (repeatable)")
+        parser.add_argument('--chunk-size', type=int, default=50000, help="Answer rows loaded per chunk")
+
+    def handle(self, *args, **options):
+        try:
+            from quiz.item_analysis import analyze_test
+        except ImportError as e:
+            raise CommandError(f"Item analysis requires NumPy ({e}). Install it with `pip install numpy`.")
+
+        tests = Test.objects.all()
+        if options['test_ids']:
+            tests = tests.filter(id__in=options['test_ids'])
+        for test in tests:
+            count = analyze_test(test, chunk_size=options['chunk_size'])
+            self.stdout.write(f"{test.name}: analysed {count} question(s)")
+        self.stdout.write(self.style.SUCCESS("Item analysis complete."))
@@ -0,0 +1,140 @@
+import copy
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from quiz.models import Test
+
+from ._benchdata import bulk_create_users, create_synthetic_test
+
+# Database settings benchmarked against each other: Django's stock SQLite connection (the
+# development default), IMMEDIATE transactions alone and settings.QUIZ_SQLITE_PRODUCTION
+PROFILES = {
+    'stock': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}},
+    'immediate': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {'transaction_mode': 'IMMEDIATE'}},
+    'production': settings.QUIZ_SQLITE_PRODUCTION,
+}
+
+_attempt_url = re.compile(r'/take/(\d+)/')
+
+
+def use_database(name, profile):
+    """ Points the default connection of every thread at the SQLite file name with the given profile """
+    connections.close_all()
+    # Connections created later (in any thread) read this same dict
+    settings_dict = connections.settings['default']
+    settings_dict['NAME'] = name
+    settings_dict.update(copy.deepcopy(profile))
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs many simulated students taking an exam at the same moment (start, answer every question, finish) "
+        "against a scratch SQLite database, once per database profile, and reports throughput and lock errors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=50, help="Simultaneous students (one thread each)")
+        parser.add_argument('--questions', type=int, default=10, help="Questions per exam (one answer write each)")
+        parser.add_argument('--profiles', nargs='+', choices=sorted(PROFILES), default=['stock', 'immediate', 'production'])
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError("This benchmark only applies to SQLite databases.")
+
+        workdir = tempfile.mkdtemp(prefix='quiz-bench-')
+        try:
+            # Migrate a scratch database once, then give every profile its own copy
+            # (WAL mode is persistent, so profiles must not share a file)
+            template = os.path.join(workdir, 'template.sqlite3')
+            use_database(template, PROFILES['stock'])
+            call_command('migrate', verbosity=0)
+            test = create_synthetic_test(options['questions'])
+            bulk_create_users(User(username=f"bench_writer_{i}", password='!') for i in range(options['writers']))
+            connections.close_all()
+
+            self.stdout.write(
+                f"{options['writers']} students, {options['questions']} questions each\n"
+                f"{'profile':>12} {'finished':>9} {'locked':>7} {'other err':>10} {'seconds':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}"
+            )
+            for profile_name in options['profiles']:
+                database = os.path.join(workdir, f'{profile_name}.sqlite3')
+                shutil.copyfile(template, database)
+                use_database(database, PROFILES[profile_name])
+                with override_settings(ALLOWED_HOSTS=['testserver']):
+                    self.run_profile(profile_name, test.id, options['writers'])
+        finally:
+            connections.close_all()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_profile(self, profile_name, test_id, writers):
+        start_barrier = threading.Barrier(writers + 1)
+        latencies, outcomes = [], []
+        lock = threading.Lock()
+
+        def student(index):
+            client = Client()
+            request_times = []
+            outcome = 'finished'
+            try:
+                try:
+                    # Logging in and reading the exam happen before the clock starts
+                    client.force_login(User.objects.get(username=f"bench_writer_{index}"))
+                    first_answers = [
+                        question.answers.order_by('slot')[0].id
+                        for question in Test.objects.get(id=test_id).questions.order_by('id')
+                    ]
+                finally:
+                    start_barrier.wait()
+
+                def timed(method, url, data=None):
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    request_times.append((time.perf_counter() - started) * 1000)
+                    return response
+
+                response = timed('get', f'/quiz/tests/start/{test_id}/')
+                attempt_id = int(_attempt_url.search(response['Location']).group(1))
+                for question_index, answer_id in enumerate(first_answers):
+                    timed('post', f'/quiz/tests/take/{attempt_id}/{question_index}/', {'selected_answers': [answer_id]})
+                response = timed('get', f'/quiz/tests/finish/{attempt_id}/')
+                if response.status_code != 302:
+                    outcome = 'error'
+            except OperationalError as error:
+                outcome = 'locked' if 'locked' in str(error) else 'error'
+            except Exception:
+                outcome = 'error'
+            finally:
+                connections.close_all()
+                with lock:
+                    latencies.extend(request_times)
+                    outcomes.append(outcome)
+
+        threads = [threading.Thread(target=student, args=(index,)) for index in range(writers)]
+        for thread in threads:
+            thread.start()
+        start_barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = statistics.median(latencies) if latencies else 0
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        self.stdout.write(
+            f"{profile_name:>12} {outcomes.count('finished'):>9} {outcomes.count('locked'):>7} {outcomes.count('error'):>10} "
+            f"{elapsed:>8.2f} {len(latencies) / elapsed:>8.1f} {p50:>8.1f} {p95:>8.1f}"
+        )
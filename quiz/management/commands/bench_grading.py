@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from quiz.grading import grade_attempt
+from quiz.models import Answer, UserAnswer
+from quiz.quiz_cache import compile_test
+
+from ._benchdata import Rollback, create_synthetic_attempt, create_synthetic_test, create_synthetic_user, measure
+
+
+def grade_per_question(attempt):
+    """ The previous finish_test loop: ~4 queries per question """
+    correct_count = 0
+    for question in attempt.test.questions.all():
+        try:
+            user_answer = UserAnswer.objects.get(test_attempt=attempt, question=question)
+            correct_answers = set(Answer.objects.filter(question=question, is_correct=True).values_list('id', flat=True))
+            user_selected_answers = set(user_answer.selected_answers.values_list('id', flat=True))
+            is_correct = (correct_answers == user_selected_answers)
+            user_answer.is_correct = is_correct
+            user_answer.save()
+            if is_correct:
+                correct_count += 1
+        except UserAnswer.DoesNotExist:
+            pass
+    return correct_count
+
+
+class Command(BaseCommand):
+    help = "Compares per-question grading with the bulk grading engine (data is rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 1000], help="Question counts to benchmark")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best time is reported)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'questions':>10} {'engine':>10} {'queries':>8} {'ms':>10} {'score':>6}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    test = create_synthetic_test(size)
+                    legacy_attempt = create_synthetic_attempt(test, create_synthetic_user(), legacy=True)
+                    attempt = create_synthetic_attempt(test, create_synthetic_user())
+                    compiled_test = compile_test(test)
+
+                    queries, ms, correct = measure(lambda: grade_per_question(legacy_attempt), options['repeat'])
+                    self.stdout.write(f"{size:>10} {'loop':>10} {queries:>8} {ms:>10.1f} {correct:>6}")
+
+                    # Reset so the bulk engine has rows to rewrite, like a fresh attempt
+                    UserAnswer.objects.filter(test_attempt=legacy_attempt).update(is_correct=False)
+                    queries, ms, (correct, _) = measure(lambda: grade_attempt(legacy_attempt, compiled_test), 1)
+                    self.stdout.write(f"{size:>10} {'bulk-m2m':>10} {queries:>8} {ms:>10.1f} {correct:>6}")
+
+                    queries, ms, (correct, _) = measure(lambda: grade_attempt(attempt, compiled_test), 1)
+                    self.stdout.write(f"{size:>10} {'bulk-mask':>10} {queries:>8} {ms:>10.1f} {correct:>6}")
+                    raise Rollback
+            except Rollback:
+                pass
@@ -0,0 +1,82 @@
+import re
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ._benchdata import Rollback, bulk_create_users, create_synthetic_test
+
+_attempt_url = re.compile(r'/take/(\d+)/')
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs students through a question-by-question exam once per session engine (settings.SESSION_ENGINES) "
+        "and reports queries and latency per request (data is rolled back)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=10, help="Students taking the exam, one after another")
+        parser.add_argument('--questions', type=int, default=20, help="Questions per exam (one GET and one POST each)")
+        parser.add_argument('--engines', nargs='+', choices=sorted(settings.SESSION_ENGINES), default=['db', 'cached_db', 'signed_cookies'])
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['students']} students, {options['questions']} questions each\n"
+            f"{'engine':>15} {'requests':>9} {'queries/req':>12} {'session q/req':>14} {'p50 ms':>8} {'mean ms':>8}"
+        )
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                test = create_synthetic_test(options['questions'])
+                users = bulk_create_users(
+                    User(username=f"bench_session_{i}", password='!') for i in range(options['students'])
+                )
+
+                for engine in options['engines']:
+                    with override_settings(SESSION_ENGINE=settings.SESSION_ENGINES[engine]):
+                        self.run_engine(engine, test, users)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            # cached_db sessions of the rolled back users
+            cache.clear()
+
+    def run_engine(self, engine, test, users):
+        query_counts, session_query_counts, latencies = [], [], []
+
+        def timed(client, method, url, data=None):
+            reset_queries() # The query log is capped, so start every request empty
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                latencies.append((time.perf_counter() - started) * 1000)
+            query_counts.append(len(ctx))
+            session_query_counts.append(sum('django_session' in query['sql'] for query in ctx.captured_queries))
+            return response
+
+        questions = list(test.questions.order_by('id').prefetch_related('answers'))
+        for user in users:
+            # Logging in is not part of the measurement
+            client = Client()
+            client.force_login(user)
+            response = timed(client, 'get', f'/quiz/tests/start/{test.id}/')
+            attempt_id = int(_attempt_url.search(response['Location']).group(1))
+            for index, question in enumerate(questions):
+                url = f'/quiz/tests/take/{attempt_id}/{index}/'
+                timed(client, 'get', url)
+                timed(client, 'post', url, {'selected_answers': [question.answers.all()[0].id]})
+            timed(client, 'get', f'/quiz/tests/finish/{attempt_id}/')
+            timed(client, 'get', f'/quiz/tests/results/{attempt_id}/')
+
+        requests = len(latencies)
+        self.stdout.write(
+            f"{engine:>15} {requests:>9} {sum(query_counts) / requests:>12.2f} "
+            f"{sum(session_query_counts) / requests:>14.2f} {statistics.median(latencies):>8.2f} {statistics.mean(latencies):>8.2f}"
+        )
@@ -0,0 +1,106 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from quiz.pagination import keyset_paginate
+from quiz.views import custom_admin_users, user_list_queryset
+
+from ._benchdata import Rollback, bulk_create_users, measure
+
+
+def legacy_user_list(search_query, filter_status):
+    """ The previous custom_admin_users query: OR'd icontains querysets, evaluated in full """
+    users_queryset = User.objects.select_related('userprofile').order_by('username')
+    if search_query:
+        users_queryset = users_queryset.filter(username__icontains=search_query) | \
+                         users_queryset.filter(email__icontains=search_query)
+    if filter_status == 'staff':
+        users_queryset = users_queryset.filter(is_staff=True)
+    elif filter_status == 'normal':
+        users_queryset = users_queryset.filter(is_staff=False)
+    elif filter_status == 'blocked':
+        users_queryset = users_queryset.filter(userprofile__blocked_until__isnull=False, userprofile__blocked_until__gt=timezone.now())
+    elif filter_status == 'active':
+        users_queryset = users_queryset.filter(userprofile__blocked_until__isnull=True) | \
+                         users_queryset.filter(userprofile__blocked_until__lt=timezone.now())
+    return len(list(users_queryset))
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the custom admin user list (search, status filters, keyset pages) on synthetic users (data is rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help="Synthetic users to create")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement (best time is reported)")
+        parser.add_argument('--skip-legacy', action='store_true', help="Don't time the previous full-list queries")
+
+    def create_users(self, count, batch_size=5000):
+        """ Creates count users in batches; every 500th is staff and 2% are blocked """
+        now = timezone.now()
+        for start in range(0, count, batch_size):
+            users = bulk_create_users(
+                (
+                    User(
+                        username=f"user{i:07d}_{random.getrandbits(24):06x}",
+                        email=f"person{i}@example{i % 50}.com",
+                        password='!', # unusable password
+                        is_staff=(i % 500 == 0),
+                    )
+                    for i in range(start, min(start + batch_size, count))
+                ),
+                blocked_until=lambda user: now + timedelta(days=1) if random.random() < 0.02 else None,
+            )
+            self.stdout.write(f"Created {start + len(users)} users...")
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        count = options['users']
+        scenarios = [
+            ('first page', {}),
+            ('deep page', {'after': f"user{count * 9 // 10:07d}"}),
+            ('prefix search', {'q': 'user00123'}),
+            ('email search', {'q': 'person4242@'}),
+            ('staff', {'status': 'staff'}),
+            ('blocked', {'status': 'blocked'}),
+            ('active', {'status': 'active'}),
+            ('search+active', {'q': f"user{count // 2:07d}"[:8], 'status': 'active'}),
+        ]
+        try:
+            with transaction.atomic():
+                self.create_users(count)
+                staff = User.objects.create(username='bench_staff', is_staff=True)
+                if connection.vendor == 'sqlite':
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+
+                # "query" is the page query alone; "view" adds rendering the page (50 rows) and is what a request costs
+                self.stdout.write(f"{'scenario':>15} {'queries':>8} {'query ms':>10} {'view ms':>10} {'rows':>6}")
+                for name, params in scenarios:
+                    def page_query():
+                        queryset = user_list_queryset(params.get('status', 'all'), params.get('q', ''), timezone.now())
+                        return list(keyset_paginate(queryset, factory.get('/quiz/admin/users/', params), key='username', cursor_type=str))
+
+                    def render_page():
+                        request = factory.get('/quiz/admin/users/', params)
+                        request.user = staff
+                        return custom_admin_users(request)
+
+                    queries, query_ms, rows = measure(page_query, options['repeat'])
+                    _, view_ms, _ = measure(render_page, options['repeat'])
+                    self.stdout.write(f"{name:>15} {queries:>8} {query_ms:>10.1f} {view_ms:>10.1f} {len(rows):>6}")
+
+                if not options['skip_legacy']:
+                    self.stdout.write("Previous implementation (whole result evaluated, unindexed icontains, query only):")
+                    for name, params in scenarios:
+                        if 'after' in params:
+                            continue
+                        queries, ms, rows = measure(lambda: legacy_user_list(params.get('q', ''), params.get('status', 'all')), 1)
+                        self.stdout.write(f"{name:>15} {queries:>8} {ms:>10.1f} {'':>10} {rows:>6}")
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,90 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from quiz.models import Answer, TestAttempt, UserAnswer
+
+
+# SQLite keeps a table-level unique constraint as an automatic index once the table has been rebuilt
+UNIQUE_ANSWER_INDEX = r'quiz_useranswer_unique_question|sqlite_autoindex_quiz_useranswer_\d+'
+
+
+def hot_queries():
+    """ (description, queryset, pattern of the index the plan must use or None for the primary key) for the quiz hot paths """
+    return [
+        (
+            "record_answer: the answer of one question",
+            UserAnswer.objects.filter(test_attempt_id=0, question_id=0).only('id', 'selected_mask', 'is_correct'),
+            UNIQUE_ANSWER_INDEX,
+        ),
+        (
+            "record_answers: existing answers of a batch",
+            UserAnswer.objects.filter(test_attempt_id=0, question_id__in=[1, 2, 3]).only('id', 'selected_mask', 'is_correct'),
+            UNIQUE_ANSWER_INDEX,
+        ),
+        (
+            "load_selections: every answer of an attempt",
+            UserAnswer.objects.filter(test_attempt_id=0).values_list('id', 'question_id', 'is_correct', 'selected_mask', 'selected_answers'),
+            UNIQUE_ANSWER_INDEX,
+        ),
+        (
+            "quiz views: the user's attempt",
+            TestAttempt.objects.select_related('test').filter(id=0, user_id=0, completed=False),
+            None,
+        ),
+        (
+            "refresh_correct_mask: correct slots of a question",
+            Answer.objects.filter(question_id=0, is_correct=True).values_list('slot', flat=True),
+            # PostgreSQL may prefer the (question, slot) index and filter its few rows; either is a lookup
+            r'quiz_answer_correct_slots|quiz_answer_unique_slot',
+        ),
+        (
+            "item analysis: completed attempts of a test",
+            TestAttempt.objects.filter(test_id=0, completed=True).order_by('id').values_list('id', flat=True),
+            'quiz_attempt_test_completed',
+        ),
+    ]
+
+
+# Plan steps that read a whole table (or a whole index) instead of seeking into an index
+_full_scans = {
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)'),
+    'postgresql': re.compile(r'\bSeq Scan\b'),
+}
+
+
+class Command(BaseCommand):
+    help = "Runs EXPLAIN on the attempt/answer hot-path queries and fails if any of them scans instead of using its index"
+
+    def explain(self, queryset):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Tiny tables are cheaper to scan, so make the planner show the index path it would use at scale
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
+
+    def handle(self, *args, **options):
+        full_scan = _full_scans.get(connection.vendor)
+        if full_scan is None:
+            raise CommandError(f"Query plans can only be checked on SQLite or PostgreSQL, not {connection.vendor}.")
+
+        failures = 0
+        for description, queryset, index_name in hot_queries():
+            plan = self.explain(queryset)
+            problems = []
+            if full_scan.search(plan):
+                problems.append("scans")
+            if index_name and not re.search(index_name, plan):
+                problems.append(f"does not use {index_name}")
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {description}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {description}"))
+            if problems or options['verbosity'] > 1:
+                self.stdout.write('\n'.join(f"       {line}" for line in plan.splitlines()))
+
+        if failures:
+            raise CommandError(f"{failures} hot-path queries don't use an index.")
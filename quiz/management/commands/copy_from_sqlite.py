@@ -0,0 +1,135 @@
+import copy
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+from quiz.models import Question
+from quiz.search import clear_index, index_questions
+
+SOURCE_ALIAS = 'copy_from_sqlite'
+
+
+def copied_models():
+    """ Every concrete table-backed model (M2M tables included), referenced models before the models referencing them """
+    models = [
+        model for model in apps.get_models(include_auto_created=True)
+        if model._meta.managed and not model._meta.proxy
+    ]
+    ordered, done = [], set()
+
+    def visit(model, path=()):
+        if model in done or model in path:
+            return
+        for field in model._meta.concrete_fields:
+            related = field.related_model if field.is_relation else None
+            if related is not None and related is not model and related in models:
+                visit(related, path + (model,))
+        done.add(model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies every row of an SQLite database (default: db.sqlite3) into the configured database, "
+        "normally PostgreSQL, keeping primary keys. Run `migrate` on the target first; its tables are emptied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', nargs='?', default=str(settings.BASE_DIR / 'db.sqlite3'), help="SQLite database file to copy")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows read and inserted per statement")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive', help="Don't ask before emptying the target tables")
+
+    def handle(self, *args, **options):
+        target = connections['default']
+        if target.vendor == 'sqlite':
+            raise CommandError("The target database is SQLite; select another one first (e.g. QUIZ_DB_PROFILE=postgres).")
+        if not Path(options['source']).is_file():
+            raise CommandError(f"{options['source']} does not exist.")
+
+        # A second connection to the SQLite file, with the default connection's settings as a base
+        source_settings = copy.deepcopy(connections.settings['default'])
+        source_settings.update({
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': options['source'], 'OPTIONS': {},
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '', 'CONN_MAX_AGE': 0,
+        })
+        connections.settings[SOURCE_ALIAS] = source_settings
+        source = connections[SOURCE_ALIAS]
+
+        source_migrations = set(MigrationRecorder(source).applied_migrations())
+        target_migrations = set(MigrationRecorder(target).applied_migrations())
+        if source_migrations != target_migrations:
+            missing = sorted('.'.join(key) for key in source_migrations ^ target_migrations)
+            raise CommandError(
+                "Source and target are not migrated to the same state; run `migrate` on both. Differences: " + ', '.join(missing[:10])
+            )
+
+        models = copied_models()
+        source_tables = set(source.introspection.table_names())
+        models = [model for model in models if model._meta.db_table in source_tables]
+
+        if options['interactive']:
+            answer = input(f"This deletes all rows of {len(models)} tables in database {target.settings_dict['NAME']!r}. Type 'yes' to continue: ")
+            if answer != 'yes':
+                raise CommandError("Copy cancelled.")
+
+        with transaction.atomic(using=target.alias), target.cursor() as cursor:
+            tables = ', '.join(target.ops.quote_name(model._meta.db_table) for model in models)
+            cursor.execute(f'TRUNCATE {tables} RESTART IDENTITY CASCADE' if target.vendor == 'postgresql' else f'DELETE FROM {tables}')
+
+        for model in models:
+            copied = self.copy_table(model, source, target, options['batch_size'])
+            self.stdout.write(f"{model._meta.db_table}: {copied} rows")
+
+        # Continue the target's ID sequences after the copied primary keys
+        with target.cursor() as cursor:
+            for sql in target.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+        # The search index is a backend-specific table outside the models (see quiz.search)
+        self.stdout.write("Rebuilding the question search index...")
+        clear_index()
+        last_id = 0
+        while True:
+            batch = list(Question.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            index_questions(batch)
+            last_id = batch[-1]
+
+        source.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(models)} tables."))
+
+    def copy_table(self, model, source, target, batch_size):
+        """ Streams one table in primary key order; each batch is one INSERT in its own transaction """
+        fields = model._meta.concrete_fields
+        pk = model._meta.pk
+        columns = ', '.join(target.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        insert = f'INSERT INTO {target.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})'
+
+        # Raw rows instead of model instances: no save() logic, signals or auto_now values get in the way
+        queryset = model._base_manager.using(source.alias).order_by(pk.attname).values_list(*(field.attname for field in fields))
+        copied = 0
+        last_pk = None
+        while True:
+            batch = queryset.filter(**{f'{pk.attname}__gt': last_pk}) if last_pk is not None else queryset
+            rows = list(batch[:batch_size])
+            if not rows:
+                return copied
+            values = [
+                [field.get_db_prep_save(value, connection=target) for field, value in zip(fields, row)]
+                for row in rows
+            ]
+            with transaction.atomic(using=target.alias), target.cursor() as cursor:
+                cursor.executemany(insert, values)
+            copied += len(rows)
+            last_pk = rows[-1][fields.index(pk)]
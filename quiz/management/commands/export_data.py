@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.exporters import DATASETS, DEFAULT_CHUNK_SIZE, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Streams questions, attempts or answers as CSV or JSON Lines to a file or stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=DATASETS)
+        parser.add_argument('--format', choices=FORMATS, default='csv', dest='file_format')
+        parser.add_argument('--test', type=int, action='append', dest='test_ids', help="Only export this test (repeatable)")
+        parser.add_argument('--output', '-o', help="Output file (default: stdout)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows fetched per database round trip")
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['dataset'], options['file_format'], test_ids=options['test_ids'], chunk_size=options['chunk_size'])
+        if not options['output']:
+            # self.stdout, so call_command(..., stdout=...) can capture or redirect the export
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        try:
+            output = open(options['output'], 'w', encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(f"Cannot write {options['output']}: {error}")
+        count = 0
+        with output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} lines to {options['output']}."))
@@ -0,0 +1,127 @@
+from datetime import timedelta
+from urllib.parse import unquote
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from quiz.models import Question, TestAttempt
+from quiz.storage import question_image_storage
+
+ROOT = 'question_images'
+
+
+def variant_names(variants):
+    """ Storage names listed in a Question.image_variants value """
+    for key in ('webp', 'jpeg'):
+        for _, _, name in variants.get(key, ()):
+            yield name
+    if variants.get('thumbnail'):
+        yield variants['thumbnail'][2]
+
+
+def snapshot_urls(snapshot):
+    """ Image URLs referenced by a TestAttempt.results_snapshot """
+    for result in (snapshot or {}).get('results', ()):
+        question = result.get('question', {})
+        if question.get('image_url'):
+            yield question['image_url']
+        image = question.get('image') or {}
+        for key in ('url', 'src', 'thumbnail_url'):
+            if image.get(key):
+                yield image[key]
+        for key in ('webp_srcset', 'jpeg_srcset'):
+            for candidate in (image.get(key) or '').split(','):
+                if candidate.strip():
+                    yield candidate.split()[0]
+
+
+class Command(BaseCommand):
+    help = "Deletes question image files (originals and variants) that no question or results snapshot refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-hours', type=float, default=24, help="Never delete files modified more recently than this")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows read per query and files deleted per batch")
+        parser.add_argument('--dry-run', action='store_true', help="Only list what would be deleted")
+
+    def referenced_names(self, storage, batch_size):
+        """ Collects every referenced storage name with keyset batches over questions and attempts """
+        referenced = set()
+
+        last_id = 0
+        while True:
+            batch = list(Question.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'image', 'image_variants')[:batch_size])
+            if not batch:
+                break
+            for _, image, variants in batch:
+                if image:
+                    referenced.add(image)
+                referenced.update(variant_names(variants or {}))
+            last_id = batch[-1][0]
+
+        # Completed attempts keep rendering the images of their snapshot, even after a question changes
+        base_url = storage.base_url
+        last_id = 0
+        while True:
+            batch = list(
+                TestAttempt.objects.filter(id__gt=last_id, results_snapshot__isnull=False).order_by('id').values_list('id', 'results_snapshot')[:batch_size]
+            )
+            if not batch:
+                break
+            for _, snapshot in batch:
+                for url in snapshot_urls(snapshot):
+                    if url.startswith(base_url):
+                        referenced.add(unquote(url[len(base_url):]))
+            last_id = batch[-1][0]
+        return referenced
+
+    def stored_files(self, storage, directory=ROOT):
+        """ Yields the names of all files below directory """
+        if not storage.exists(directory):
+            return
+        directories, files = storage.listdir(directory)
+        for filename in files:
+            yield f'{directory}/{filename}'
+        for subdirectory in directories:
+            yield from self.stored_files(storage, f'{directory}/{subdirectory}')
+
+    def handle(self, *args, **options):
+        storage = question_image_storage()
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+
+        referenced = self.referenced_names(storage, batch_size)
+        self.stdout.write(f"{len(referenced)} referenced files.")
+
+        deleted = kept_recent = freed = 0
+        candidates = []
+
+        def sweep(names):
+            nonlocal deleted, freed
+            # Re-check originals against the database right before deleting: an upload may have reused one meanwhile
+            names = set(names) - set(Question.objects.filter(image__in=names).values_list('image', flat=True))
+            for name in sorted(names):
+                size = storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(f"would delete {name} ({size} bytes)")
+                else:
+                    storage.delete(name)
+                deleted += 1
+                freed += size
+
+        for name in self.stored_files(storage):
+            if name in referenced:
+                continue
+            if storage.get_modified_time(name) > cutoff:
+                kept_recent += 1
+                continue
+            candidates.append(name)
+            if len(candidates) >= batch_size:
+                sweep(candidates)
+                candidates = []
+        if candidates:
+            sweep(candidates)
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} unreferenced files ({freed / 1024 / 1024:.1f} MB); kept {kept_recent} recent unreferenced files."
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from quiz.images import refresh_question_image
+from quiz.models import Question
+from quiz.quiz_cache import bump_content_version
+
+
+class Command(BaseCommand):
+    help = "Generates resized WebP/JPEG variants and thumbnails for question images that don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants for every image")
+        parser.add_argument('--batch-size', type=int, default=100, help="Questions read per query")
+
+    def handle(self, *args, **options):
+        questions = Question.objects.exclude(image='').exclude(image__isnull=True).order_by('id').only(
+            'id', 'test_id', 'image', 'image_width', 'image_height', 'image_variants'
+        )
+        processed = failed = 0
+        test_ids = set()
+        last_id = 0
+        while True:
+            batch = list(questions.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            for question in batch:
+                if not options['force'] and (question.image_variants or {}).get('source') == question.image.name:
+                    continue
+                refresh_question_image(question)
+                if question.image_variants.get('jpeg'):
+                    processed += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"Question {question.id}: could not process {question.image.name}")
+                test_ids.add(question.test_id)
+            last_id = batch[-1].id
+
+        # update() bypasses signals, so invalidate the compiled tests once at the end
+        if test_ids:
+            bump_content_version(test_ids)
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {processed} images ({failed} failed)."))
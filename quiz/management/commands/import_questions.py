@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.importers import DEFAULT_CHUNK_SIZE, FORMATS, detect_format, import_questions
+from quiz.models import Test
+
+
+class Command(BaseCommand):
+    help = "Imports a question bank from a CSV, JSON/JSON Lines or GIFT file, streaming it in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--test', type=int, dest='test_id', help="ID of the test to add the questions to")
+        target.add_argument('--create-test', metavar='NAME', help="Create a new test with this name")
+        parser.add_argument('--test-type', choices=['learning', 'exam'], default='exam', help="Type of a test made with --create-test")
+        parser.add_argument('--format', choices=FORMATS, dest='file_format', help="File format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Questions written per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Only parse and validate the file")
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError("Cannot tell the file format from its extension; pass --format.")
+
+        if options['test_id']:
+            try:
+                test = Test.objects.get(id=options['test_id'])
+            except Test.DoesNotExist:
+                raise CommandError(f"Test {options['test_id']} does not exist.")
+        elif options['dry_run']:
+            test = Test(name=options['create_test'], test_type=options['test_type'])
+        else:
+            test = Test.objects.create(name=options['create_test'], test_type=options['test_type'])
+            self.stdout.write(f"Created test {test.id}: {test.name}")
+
+        def progress(result):
+            self.stdout.write(f"{result.created} questions {'validated' if options['dry_run'] else 'imported'}, {result.error_count} errors...")
+
+        start = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = import_questions(
+                    stream, file_format, test,
+                    chunk_size=options['chunk_size'], dry_run=options['dry_run'], progress=progress,
+                )
+        except OSError as error:
+            raise CommandError(f"Cannot read {options['path']}: {error}")
+        elapsed = time.perf_counter() - start
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line or '?'}: {message}")
+        if result.errors_truncated:
+            self.stderr.write(f"... and {result.error_count - len(result.errors)} more errors")
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        style = self.style.SUCCESS if not result.error_count else self.style.WARNING
+        self.stdout.write(style(f"{verb} {result.created} questions in {elapsed:.1f}s; {result.error_count} records skipped."))
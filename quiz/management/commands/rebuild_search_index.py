@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from quiz.models import Question
+from quiz.search import clear_index, index_questions, index_table
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the question full-text search index from the question bank, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Questions indexed per batch")
+
+    def handle(self, *args, **options):
+        table = index_table()
+        if table is None:
+            self.stdout.write(self.style.WARNING("This database has no search index; search uses an unindexed scan."))
+            return
+
+        batch_size = options['batch_size']
+        indexed = 0
+        last_id = 0
+        with transaction.atomic():
+            # Start from an empty index so documents of vanished questions don't linger
+            clear_index()
+            while True:
+                batch = list(Question.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+                if not batch:
+                    break
+                index_questions(batch)
+                indexed += len(batch)
+                last_id = batch[-1]
+                self.stdout.write(f"Indexed {indexed} questions...")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index ({table}) for {indexed} questions."))
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from quiz.models import SCORE_BUCKET_COUNT, Test, TestAttempt, TestScoreBucket, TestStatistics, score_bucket
+
+
+class Command(BaseCommand):
+    help = "Rebuilds TestStatistics and score histograms from all attempts, in batched passes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--test', type=int, action='append', dest='test_ids', help="Only rebuild this test (repeatable)")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Attempts read per query")
+
+    def handle(self, *args, **options):
+        if options['test_ids']:
+            test_ids = sorted(set(options['test_ids']))
+            missing = set(test_ids) - set(Test.objects.filter(id__in=test_ids).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"No test with ID {', '.join(str(test_id) for test_id in sorted(missing))}.")
+        else:
+            test_ids = list(Test.objects.values_list('id', flat=True))
+        batch_size = options['batch_size']
+
+        # Reading and rewriting happen in one transaction that holds the statistics rows: attempts started
+        # or finished meanwhile increment these rows in their own transaction, so they wait for the rebuild
+        # and are added on top of it instead of being counted twice or overwritten
+        with transaction.atomic():
+            TestStatistics.objects.bulk_create((TestStatistics(test_id=test_id) for test_id in test_ids), ignore_conflicts=True)
+            list(TestStatistics.objects.select_for_update().filter(test_id__in=test_ids).values_list('test_id', flat=True))
+
+            totals, processed = self.read_attempts(test_ids, batch_size)
+
+            now = timezone.now()
+            TestStatistics.objects.bulk_update(
+                [
+                    TestStatistics(
+                        test_id=test_id,
+                        attempt_count=total['attempt_count'],
+                        completed_count=total['completed_count'],
+                        scored_count=total['scored_count'],
+                        score_sum=total['score_sum'],
+                        score_sum_squares=total['score_sum_squares'],
+                        updated_at=now,
+                    )
+                    for test_id, total in totals.items()
+                ],
+                ['attempt_count', 'completed_count', 'scored_count', 'score_sum', 'score_sum_squares', 'updated_at'],
+                batch_size=1000,
+            )
+            TestScoreBucket.objects.filter(test_id__in=test_ids).delete()
+            TestScoreBucket.objects.bulk_create(
+                TestScoreBucket(test_id=test_id, bucket=bucket, count=count)
+                for test_id, total in totals.items()
+                for bucket, count in enumerate(total['buckets'])
+                if count
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {len(totals)} test(s) from {processed} attempts."))
+
+    def read_attempts(self, test_ids, batch_size):
+        """ Returns ({test_id: running totals}, number of attempts read) """
+        # Per-test running totals; memory grows with the number of tests, not attempts
+        totals = {
+            test_id: {'attempt_count': 0, 'completed_count': 0, 'scored_count': 0, 'score_sum': 0.0, 'score_sum_squares': 0.0, 'buckets': [0] * SCORE_BUCKET_COUNT}
+            for test_id in test_ids
+        }
+
+        # Keyset batches over the primary key: no OFFSET scans
+        attempts = TestAttempt.objects.filter(test_id__in=test_ids).order_by('id')
+        last_id = 0
+        processed = 0
+        while True:
+            batch = list(attempts.filter(id__gt=last_id).values_list('id', 'test_id', 'completed', 'score')[:batch_size])
+            if not batch:
+                break
+            for attempt_id, test_id, completed, score in batch:
+                total = totals[test_id]
+                total['attempt_count'] += 1
+                if completed:
+                    total['completed_count'] += 1
+                    if score is not None:
+                        total['scored_count'] += 1
+                        total['score_sum'] += score
+                        total['score_sum_squares'] += score * score
+                        total['buckets'][score_bucket(score)] += 1
+            last_id = batch[-1][0]
+            processed += len(batch)
+            self.stdout.write(f"Read {processed} attempts...")
+        return totals, processed
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from quiz.images import refresh_question_image
+from quiz.models import Question
+from quiz.quiz_cache import bump_content_version
+from quiz.storage import question_image_storage
+
+
+class Command(BaseCommand):
+    help = "Moves question images uploaded before content-addressed storage to hashed names, merging duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Questions read per query")
+
+    def handle(self, *args, **options):
+        storage = question_image_storage()
+        questions = Question.objects.exclude(image='').exclude(image__isnull=True).order_by('id').only(
+            'id', 'test_id', 'image', 'image_width', 'image_height', 'image_variants'
+        )
+        moved = missing = 0
+        test_ids = set()
+        last_id = 0
+        while True:
+            batch = list(questions.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            for question in batch:
+                old_name = question.image.name
+                if storage.is_content_addressed(old_name):
+                    continue
+                if not storage.exists(old_name):
+                    missing += 1
+                    self.stderr.write(f"Question {question.id}: {old_name} is missing")
+                    continue
+                with storage.open(old_name, 'rb') as content:
+                    new_name = storage.save(old_name, content)
+                Question.objects.filter(id=question.id).update(image=new_name)
+                question.image.name = new_name
+                # Variants are keyed by source name, so they are regenerated (or reused from a duplicate)
+                refresh_question_image(question)
+                test_ids.add(question.test_id)
+                moved += 1
+                self.stdout.write(f"{old_name} -> {new_name}")
+            last_id = batch[-1].id
+
+        if test_ids:
+            bump_content_version(test_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} images to content-addressed names ({missing} missing). Run gc_media to delete the old files."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_alter_answer_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testattempt',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
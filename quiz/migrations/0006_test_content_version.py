@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_testattempt_question_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-18 01:12, backfill added manually
+
+from django.db import migrations, models
+
+
+def assign_answer_slots(apps, schema_editor):
+    """ Numbers each question's existing answers 0..N by ID and computes the correct masks """
+    Question = apps.get_model('quiz', 'Question')
+    Answer = apps.get_model('quiz', 'Answer')
+
+    answers = []
+    masks = {}
+    slot = 0
+    question_id = None
+    for answer in Answer.objects.order_by('question_id', 'id').only('id', 'question_id', 'is_correct').iterator(chunk_size=2000):
+        if answer.question_id != question_id:
+            question_id = answer.question_id
+            slot = 0
+        answer.slot = slot
+        answers.append(answer)
+        if answer.is_correct:
+            masks[question_id] = masks.get(question_id, 0) | (1 << slot)
+        slot += 1
+        if len(answers) >= 2000:
+            Answer.objects.bulk_update(answers, ['slot'])
+            answers = []
+    Answer.objects.bulk_update(answers, ['slot'])
+
+    questions = [Question(id=question_id, correct_mask=mask) for question_id, mask in masks.items()]
+    Question.objects.bulk_update(questions, ['correct_mask'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_test_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='slot',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='correct_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='useranswer',
+            name='selected_mask',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='useranswer',
+            name='selected_answers',
+            field=models.ManyToManyField(blank=True, to='quiz.answer'),
+        ),
+        migrations.RunPython(assign_answer_slots, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='answer',
+            name='slot',
+            field=models.PositiveSmallIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('question', 'slot'), name='quiz_answer_unique_slot'),
+        ),
+    ]
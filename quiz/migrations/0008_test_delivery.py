@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_answer_slot_question_correct_mask_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='delivery',
+            field=models.CharField(choices=[('paged', 'One Question per Page'), ('single_page', 'Single Page (all questions loaded at once)')], default='paged', help_text='Only applies to Exam Mode', max_length=20),
+        ),
+    ]
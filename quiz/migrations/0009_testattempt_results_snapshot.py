@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_test_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testattempt',
+            name='results_snapshot',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
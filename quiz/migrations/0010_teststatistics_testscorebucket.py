@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 00:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_testattempt_results_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestStatistics',
+            fields=[
+                ('test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', serialize=False, to='quiz.test')),
+                ('attempt_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('scored_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sum_squares', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TestScoreBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_buckets', to='quiz.test')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('test', 'bucket'), name='quiz_scorebucket_unique_bucket')],
+            },
+        ),
+    ]
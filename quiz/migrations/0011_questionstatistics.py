@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 00:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_teststatistics_testscorebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStatistics',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='item_statistics', serialize=False, to='quiz.question')),
+                ('response_count', models.PositiveIntegerField(default=0)),
+                ('p_value', models.FloatField(blank=True, null=True)),
+                ('discrimination', models.FloatField(blank=True, null=True)),
+                ('selection_counts', models.JSONField(blank=True, default=dict)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
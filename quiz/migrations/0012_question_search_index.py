@@ -0,0 +1,74 @@
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+from django.utils.html import strip_tags
+
+BATCH_SIZE = 1000
+
+
+def _documents(apps, batch):
+    Answer = apps.get_model('quiz', 'Answer')
+    answers = {}
+    for question_id, text in Answer.objects.filter(question_id__in=[row[0] for row in batch]).order_by('slot').values_list('question_id', 'text'):
+        answers.setdefault(question_id, []).append(text)
+    return [
+        (question_id, strip_tags(text), '\n'.join(answers.get(question_id, [])), strip_tags(explanation))
+        for question_id, text, explanation in batch
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    "CREATE VIRTUAL TABLE quiz_question_fts USING fts5("
+                    "text, answers, explanation, tokenize = 'unicode61 remove_diacritics 2')"
+                )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to an unindexed scan
+            return
+        insert = 'INSERT INTO quiz_question_fts (rowid, text, answers, explanation) VALUES (%s, %s, %s, %s)'
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE quiz_question_search ('
+            'question_id bigint PRIMARY KEY REFERENCES quiz_question (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute('CREATE INDEX quiz_question_search_document ON quiz_question_search USING gin (document)')
+        insert = (
+            "INSERT INTO quiz_question_search (question_id, document) VALUES (%s, "
+            "setweight(to_tsvector('english', %s), 'A') || "
+            "setweight(to_tsvector('english', %s), 'B') || "
+            "setweight(to_tsvector('english', %s), 'C'))"
+        )
+    else:
+        return
+
+    # Index the existing bank in primary key batches
+    Question = apps.get_model('quiz', 'Question')
+    last_id = 0
+    while True:
+        batch = list(Question.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'text', 'explanation')[:BATCH_SIZE])
+        if not batch:
+            break
+        with connection.cursor() as cursor:
+            cursor.executemany(insert, _documents(apps, batch))
+        last_id = batch[-1][0]
+
+
+def drop_search_index(apps, schema_editor):
+    table = {'sqlite': 'quiz_question_fts', 'postgresql': 'quiz_question_search'}.get(schema_editor.connection.vendor)
+    if table:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_questionstatistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
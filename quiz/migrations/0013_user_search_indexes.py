@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 00:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_question_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['blocked_until'], name='quiz_profile_blocked_until'),
+        ),
+        # Expression indexes on django.contrib.auth's user table for the custom admin user list:
+        # case-insensitive prefix search (range predicates on lower()) and the staff/normal filters
+        migrations.RunSQL(
+            sql=[
+                'CREATE INDEX quiz_auth_user_username_lower ON auth_user (lower(username))',
+                'CREATE INDEX quiz_auth_user_email_lower ON auth_user (lower(email))',
+                'CREATE INDEX quiz_auth_user_staff_username ON auth_user (is_staff, username)',
+            ],
+            reverse_sql=[
+                'DROP INDEX quiz_auth_user_username_lower',
+                'DROP INDEX quiz_auth_user_email_lower',
+                'DROP INDEX quiz_auth_user_staff_username',
+            ],
+        ),
+    ]
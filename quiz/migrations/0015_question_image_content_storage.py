@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 00:53
+
+import quiz.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0014_question_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='question',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=quiz.storage.question_image_storage, upload_to='question_images/'),
+        ),
+    ]
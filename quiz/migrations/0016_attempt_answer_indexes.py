@@ -0,0 +1,59 @@
+# Generated by Django 5.2 on 2026-10-18 01:04, deduplication and operation order edited manually
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_answers(apps, schema_editor):
+    """
+    Keeps one UserAnswer per (attempt, question) before the unique constraint is added: the
+    lowest ID, which is the row record_answer updated and load_selections read
+    """
+    UserAnswer = apps.get_model('quiz', 'UserAnswer')
+    duplicates = (
+        UserAnswer.objects.values('test_attempt_id', 'question_id')
+        .annotate(rows=Count('id'), keep_id=Min('id'))
+        .filter(rows__gt=1)
+        .values_list('test_attempt_id', 'question_id', 'keep_id')
+    )
+    for test_attempt_id, question_id, keep_id in duplicates.iterator(chunk_size=2000):
+        # Their legacy M2M selections go with them (cascade)
+        UserAnswer.objects.filter(test_attempt_id=test_attempt_id, question_id=question_id).exclude(id=keep_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0015_question_image_content_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='useranswer',
+            constraint=models.UniqueConstraint(fields=('test_attempt', 'question'), name='quiz_useranswer_unique_question'),
+        ),
+        # The unique index above leads with test_attempt, so the plain FK index is dropped only now
+        migrations.AlterField(
+            model_name='useranswer',
+            name='test_attempt',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_answers', to='quiz.testattempt'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'is_correct', 'slot'], name='quiz_answer_correct_slots'),
+        ),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['test', 'completed'], name='quiz_attempt_test_completed'),
+        ),
+        # Same for TestAttempt.test, now covered by quiz_attempt_test_completed
+        migrations.AlterField(
+            model_name='testattempt',
+            name='test',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='quiz.test'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, transaction
+from django.db.utils import DatabaseError
+
+
+def create_trigram_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            # Server without the contrib extensions: search keeps working without typo tolerance
+            return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        # Not allowed to create extensions: a superuser can run the statement and re-run this migration
+        return
+    schema_editor.execute('CREATE INDEX quiz_question_text_trgm ON quiz_question USING gin (text gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS quiz_question_text_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0016_attempt_answer_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
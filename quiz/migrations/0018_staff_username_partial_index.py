@@ -0,0 +1,26 @@
+# Replaces the (is_staff, username) index of migration 0013 with a partial index
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0017_question_text_trigram'),
+    ]
+
+    operations = [
+        # The staff filter compiles to a bare `WHERE "auth_user"."is_staff"`, which SQLite can't match
+        # against an index on (is_staff, username): it walked every user in username order instead.
+        # A partial index over the few staff accounts matches that term on SQLite and PostgreSQL.
+        migrations.RunSQL(
+            sql=[
+                'DROP INDEX quiz_auth_user_staff_username',
+                'CREATE INDEX quiz_auth_user_staff_username ON auth_user (username) WHERE is_staff',
+            ],
+            reverse_sql=[
+                'DROP INDEX quiz_auth_user_staff_username',
+                'CREATE INDEX quiz_auth_user_staff_username ON auth_user (is_staff, username)',
+            ],
+        ),
+    ]
@@ -1,10 +1,13 @@
-from django.db import models
+from django.db import models, IntegrityError, transaction
 from django.conf import settings
+from django.core.cache import cache
 # Import Django's default User model
 from django.contrib.auth.models import User
 # Import signals for automatic profile creation
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.db.models import F
+from .storage import question_image_storage
 from django.db.models import Avg # For User.average_score if we add it back, though it's on CustomUser previously.
                                 # Let's keep it here for now for safety.
 
@@ -17,9 +20,31 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='userprofile')
     blocked_until = models.DateTimeField(null=True, blank=True) # Field for temporary blocking
 
+    class Meta:
+        # The "blocked" user filter is a range scan on this index
+        indexes = [models.Index(fields=['blocked_until'], name='quiz_profile_blocked_until')]
+
     def __str__(self):
         return self.user.username + " Profile"
 
+    @staticmethod
+    def blocked_until_cache_key(user_id):
+        return f"quiz:blocked_until:{user_id}"
+
+    @classmethod
+    def get_blocked_until(cls, user_id):
+        """
+        Returns blocked_until for a user, from the Django cache when possible.
+        The value is wrapped in a tuple so a cached "not blocked" (None) is not mistaken for a miss.
+        """
+        key = cls.blocked_until_cache_key(user_id)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0]
+        blocked_until = cls.objects.filter(user_id=user_id).values_list('blocked_until', flat=True).first()
+        cache.set(key, (blocked_until,), getattr(settings, 'QUIZ_BLOCK_STATUS_CACHE_TIMEOUT', 300))
+        return blocked_until
+
 # --- NEW: Signals to Create/Save UserProfile Automatically ---
 # This ensures every new User automatically gets a UserProfile
 @receiver(post_save, sender=User)
@@ -33,6 +58,12 @@ def save_user_profile(sender, instance, **kwargs):
     """Saves the UserProfile whenever the User is saved."""
     instance.userprofile.save()
 
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def clear_cached_block_status(sender, instance, **kwargs):
+    """Drops the cached blocked_until so blocking/unblocking applies on the next request."""
+    cache.delete(UserProfile.blocked_until_cache_key(instance.user_id))
+
 # --- Your existing models below ---
 
 # Define Test Types
@@ -41,12 +72,48 @@ TEST_TYPES = (
     ('exam', 'Exam Mode'),
 )
 
+# How Exam Mode questions are delivered to the browser
+DELIVERY_MODES = (
+    ('paged', 'One Question per Page'),
+    ('single_page', 'Single Page (all questions loaded at once)'),
+)
+
+# Spacing between test positions, leaving room to move tests without renumbering their neighbours
+POSITION_GAP = 1024
+
+def _longest_increasing_run(values):
+    """ Returns the indexes of a longest strictly increasing subsequence of values (O(n log n)) """
+    tails = [] # tails[k]: index of the smallest tail of an increasing subsequence of length k + 1
+    previous = [None] * len(values)
+    for i, value in enumerate(values):
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if values[tails[middle]] < value:
+                low = middle + 1
+            else:
+                high = middle
+        previous[i] = tails[low - 1] if low > 0 else None
+        if low == len(tails):
+            tails.append(i)
+        else:
+            tails[low] = i
+    result = set()
+    i = tails[-1] if tails else None
+    while i is not None:
+        result.add(i)
+        i = previous[i]
+    return result
+
 class Test(models.Model):
     """ Represents a type of test (e.g., 'Math Basics - Learning', 'Final Exam') """
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     test_type = models.CharField(max_length=10, choices=TEST_TYPES, default='learning')
+    delivery = models.CharField(max_length=20, choices=DELIVERY_MODES, default='paged', help_text="Only applies to Exam Mode")
     position = models.PositiveIntegerField(default=0, help_text="Display order of the test")
+    # Bumped whenever the test, its questions or their answers change (see quiz_cache.py)
+    content_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['position', 'name']
@@ -54,44 +121,324 @@ class Test(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_test_type_display()})"
 
+    @property
+    def is_single_page_exam(self):
+        return self.test_type == 'exam' and self.delivery == 'single_page'
+
+    @classmethod
+    def apply_order(cls, test_ids):
+        """
+        Reorders tests to match test_ids, rewriting as few positions as possible.
+        Tests whose current positions already ascend in the new order (the longest such run)
+        keep them; the others are placed in the gaps between their neighbours. Only when a gap
+        is too small are all positions renumbered POSITION_GAP apart. Changed rows are written
+        with a single bulk UPDATE. Returns the number of tests whose position changed.
+        """
+        with transaction.atomic():
+            current = dict(cls.objects.filter(id__in=test_ids).values_list('id', 'position'))
+            test_ids = [test_id for test_id in dict.fromkeys(test_ids) if test_id in current]
+            old_positions = [current[test_id] for test_id in test_ids]
+            kept = _longest_increasing_run(old_positions)
+
+            new_positions = list(old_positions)
+            index = 0
+            while index < len(test_ids):
+                if index in kept:
+                    index += 1
+                    continue
+                # A run of moved tests between two kept neighbours (or the list ends)
+                run_end = index
+                while run_end < len(test_ids) and run_end not in kept:
+                    run_end += 1
+                lower = old_positions[index - 1] if index > 0 else -1
+                upper = old_positions[run_end] if run_end < len(test_ids) else lower + (run_end - index + 1) * POSITION_GAP
+                step = (upper - lower) // (run_end - index + 1)
+                if step < 1:
+                    new_positions = [(i + 1) * POSITION_GAP for i in range(len(test_ids))]
+                    break
+                for offset, i in enumerate(range(index, run_end), start=1):
+                    new_positions[i] = lower + step * offset
+                index = run_end
+
+            changed = [
+                cls(id=test_id, position=new)
+                for test_id, old, new in zip(test_ids, old_positions, new_positions)
+                if old != new
+            ]
+            cls.objects.bulk_update(changed, ['position'])
+        return len(changed)
+
 class Question(models.Model):
     """ Represents a single multiple-choice question """
     test = models.ForeignKey(Test, related_name='questions', on_delete=models.CASCADE)
     text = models.TextField()
-    image = models.ImageField(upload_to='question_images/', blank=True, null=True)
+    # Stored by content hash, so identical uploads share one file (see quiz/storage.py)
+    image = models.ImageField(upload_to='question_images/', storage=question_image_storage, blank=True, null=True)
+    # Filled in by quiz.images when an image is uploaded: display size of the original
+    # (after EXIF rotation) and the resized WebP/JPEG variants and thumbnail
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     explanation = models.TextField(blank=True)
+    # Bit N is set when the answer in slot N is correct (kept in sync by the Answer signals below)
+    correct_mask = models.BigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.text[:50] + '...' if len(self.text) > 50 else self.text
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        question = super().from_db(db, field_names, values)
+        # The test the question was loaded from: moving it to another test invalidates both (quiz_cache)
+        question._loaded_test_id = question.__dict__.get('test_id')
+        return question
+
+    def refresh_correct_mask(self):
+        """ Recomputes correct_mask from the question's answers and stores it """
+        self.correct_mask = answer_slots_to_mask(
+            self.answers.filter(is_correct=True).values_list('slot', flat=True)
+        )
+        Question.objects.filter(id=self.id).update(correct_mask=self.correct_mask)
+
+# Answer slots are bit positions in a signed 64-bit mask
+MAX_ANSWER_SLOT = 62
+
+def answer_slots_to_mask(slots):
+    """ Packs answer slot numbers into a bitmask """
+    mask = 0
+    for slot in slots:
+        mask |= 1 << slot
+    return mask
+
+def mask_to_answer_slots(mask):
+    """ Unpacks a bitmask into the answer slot numbers it contains """
+    return [slot for slot in range(MAX_ANSWER_SLOT + 1) if mask >> slot & 1]
+
 class Answer(models.Model):
     """ Represents an answer choice for a question """
     question = models.ForeignKey(Question, related_name='answers', on_delete=models.CASCADE)
     text = models.CharField(max_length=1000)
     is_correct = models.BooleanField(default=False)
+    # Bit position of this answer in Question.correct_mask and UserAnswer.selected_mask
+    slot = models.PositiveSmallIntegerField(editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['question', 'slot'], name='quiz_answer_unique_slot'),
+        ]
+        indexes = [
+            # Covers the correct-slot lookup of Question.refresh_correct_mask without reading the table
+            models.Index(fields=['question', 'is_correct', 'slot'], name='quiz_answer_correct_slots'),
+        ]
 
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        if self.slot is None:
+            self.slot = self.next_free_slot(self.question_id)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def next_free_slot(question_id):
+        """
+        Returns the slot for a new answer of a question. Slots after the highest used one
+        are preferred so a deleted answer's bit is not immediately reused by a new answer.
+        """
+        used = set(Answer.objects.filter(question_id=question_id).values_list('slot', flat=True))
+        if not used:
+            return 0
+        if max(used) < MAX_ANSWER_SLOT:
+            return max(used) + 1
+        for slot in range(MAX_ANSWER_SLOT + 1):
+            if slot not in used:
+                return slot
+        raise ValueError(f"A question cannot have more than {MAX_ANSWER_SLOT + 1} answers.")
+
 class TestAttempt(models.Model):
     """ Tracks a user's attempt at a specific test """
     # This foreign key correctly points to Django's default User model
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    test = models.ForeignKey(Test, on_delete=models.CASCADE)
+    # No index of its own: the (test, completed) index below starts with it
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, db_index=False)
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
     score = models.FloatField(null=True, blank=True) # Percentage or points
     completed = models.BooleanField(default=False)
+    # Ordered question IDs frozen when the attempt starts, so question N stays question N
+    # even if staff add or delete questions while the attempt is in progress
+    question_ids = models.JSONField(default=list, blank=True, editable=False)
+    # Everything test_results displays, written once when the attempt is completed
+    results_snapshot = models.JSONField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Completed attempts of a test in ID order (item analysis, statistics rebuilds)
+            models.Index(fields=['test', 'completed'], name='quiz_attempt_test_completed'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.test.name} ({'Completed' if self.completed else 'In Progress'})"
 
+    @staticmethod
+    def snapshot_question_ids(test):
+        """ Returns the ordered question IDs of a test as stored on a new attempt """
+        return list(test.questions.order_by('id').values_list('id', flat=True))
+
+    def get_question_ids(self):
+        """ Returns the frozen question order, snapshotting it for attempts started before it existed """
+        if not self.question_ids:
+            self.question_ids = self.snapshot_question_ids(self.test)
+            if self.pk and self.question_ids:
+                self.save(update_fields=['question_ids'])
+        return self.question_ids
+
+# --- Per-test statistics, maintained incrementally ---
+
+# Score histogram buckets: 0-9, 10-19, ..., 90-100
+SCORE_BUCKET_COUNT = 10
+
+def score_bucket(score):
+    """ Returns the histogram bucket for a percentage score """
+    return min(int(score // (100 / SCORE_BUCKET_COUNT)), SCORE_BUCKET_COUNT - 1)
+
+def _increment_or_create(queryset, create_kwargs, **increments):
+    """ Applies F() increments to the single row matched by queryset, creating it first if missing """
+    updates = {field: F(field) + value for field, value in increments.items()}
+    if queryset.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            queryset.model.objects.create(**create_kwargs, **increments)
+    except IntegrityError:
+        # Another request created the row in the meantime
+        queryset.update(**updates)
+
+class TestStatistics(models.Model):
+    """
+    Running aggregates over a test's attempts. Every change is a single UPDATE with F()
+    increments, so concurrent finishes never read-modify-write. Mean and variance are
+    derived from the score sum and sum of squares. Rebuild with `manage.py rebuild_test_statistics`.
+    """
+    test = models.OneToOneField(Test, on_delete=models.CASCADE, primary_key=True, related_name='statistics')
+    attempt_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    scored_count = models.PositiveIntegerField(default=0) # Completed attempts with a score (Exam Mode)
+    score_sum = models.FloatField(default=0)
+    score_sum_squares = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Statistics for {self.test.name}"
+
+    @property
+    def score_mean(self):
+        return self.score_sum / self.scored_count if self.scored_count else None
+
+    @property
+    def score_variance(self):
+        if not self.scored_count:
+            return None
+        mean = self.score_sum / self.scored_count
+        # Clamp tiny negative values caused by floating point rounding
+        return max(self.score_sum_squares / self.scored_count - mean * mean, 0.0)
+
+    @property
+    def score_stddev(self):
+        variance = self.score_variance
+        return variance ** 0.5 if variance is not None else None
+
+    def score_histogram(self):
+        """ Returns the attempt count of every score bucket, lowest first """
+        counts = [0] * SCORE_BUCKET_COUNT
+        for bucket, count in self.test.score_buckets.values_list('bucket', 'count'):
+            counts[bucket] = count
+        return counts
+
+    @classmethod
+    def record_attempt_started(cls, test_id):
+        _increment_or_create(cls.objects.filter(test_id=test_id), {'test_id': test_id}, attempt_count=1)
+
+    @classmethod
+    def record_attempt_completed(cls, test_id, score):
+        """ Adds a completed attempt (score is None in Learning Mode) to the test's statistics """
+        if score is None:
+            _increment_or_create(cls.objects.filter(test_id=test_id), {'test_id': test_id}, completed_count=1)
+            return
+        _increment_or_create(
+            cls.objects.filter(test_id=test_id), {'test_id': test_id},
+            completed_count=1, scored_count=1, score_sum=score, score_sum_squares=score * score,
+        )
+        bucket = score_bucket(score)
+        _increment_or_create(
+            TestScoreBucket.objects.filter(test_id=test_id, bucket=bucket), {'test_id': test_id, 'bucket': bucket},
+            count=1,
+        )
+
+class TestScoreBucket(models.Model):
+    """ Number of scored attempts of a test in one score histogram bucket """
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='score_buckets')
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['test', 'bucket'], name='quiz_scorebucket_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.test.name} bucket {self.bucket}: {self.count}"
+
+class QuestionStatistics(models.Model):
+    """ Classic item statistics for a question, computed in bulk by `manage.py analyze_items` """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='item_statistics')
+    response_count = models.PositiveIntegerField(default=0)
+    # Difficulty: share of responses that were correct (higher means easier)
+    p_value = models.FloatField(null=True, blank=True)
+    # Discrimination index: correct share in the top-scoring group minus the bottom-scoring group
+    discrimination = models.FloatField(null=True, blank=True)
+    # How often each answer was selected, {answer_id: count}
+    selection_counts = models.JSONField(default=dict, blank=True)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Item statistics for question {self.question_id}"
+
 class UserAnswer(models.Model):
     """ Stores the answers selected by a user for a specific question during an attempt """
-    test_attempt = models.ForeignKey(TestAttempt, related_name='user_answers', on_delete=models.CASCADE)
+    # No index of its own: the (test_attempt, question) unique index below starts with it
+    test_attempt = models.ForeignKey(TestAttempt, related_name='user_answers', on_delete=models.CASCADE, db_index=False)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    selected_answers = models.ManyToManyField(Answer) # User can select multiple answers
+    # Legacy selection storage; answers recorded since selected_mask was added leave it empty
+    selected_answers = models.ManyToManyField(Answer, blank=True)
+    # Bitmask of the selected answer slots (NULL for legacy answers stored in selected_answers)
+    selected_mask = models.BigIntegerField(null=True, blank=True)
     is_correct = models.BooleanField(default=False) # Store if the user's selection for THIS question was correct
 
+    class Meta:
+        constraints = [
+            # One answer per question and attempt; its index serves every per-attempt lookup
+            models.UniqueConstraint(fields=['test_attempt', 'question'], name='quiz_useranswer_unique_question'),
+        ]
+
     def __str__(self):
-        return f"Attempt {self.test_attempt.id} - Q: {self.question.id}"
\ No newline at end of file
+        return f"Attempt {self.test_attempt.id} - Q: {self.question.id}"
+
+def deleted_with(origin, *parent_models):
+    """
+    True if a post_delete signal's origin (the instance or queryset whose delete() was called)
+    is one of parent_models, i.e. the row is going away in a cascade from its parent. Receivers
+    use it to skip per-row work that the parent's own deletion makes unnecessary.
+    """
+    model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return model in parent_models
+
+# Keep Question.correct_mask consistent with its Answer rows
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def update_question_correct_mask(sender, instance, raw=False, origin=None, **kwargs):
+    # Answers deleted along with their question (or its test) leave no mask to update
+    if raw or deleted_with(origin, Question, Test):
+        return
+    question = Question(id=instance.question_id)
+    question.refresh_correct_mask()
\ No newline at end of file
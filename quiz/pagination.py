@@ -0,0 +1,100 @@
+"""
+Keyset (cursor) pagination for the custom admin lists.
+
+Pages are selected with `WHERE key > cursor ORDER BY key LIMIT n` instead of OFFSET, so
+every page costs the same index range scan no matter how deep the user navigates, and
+rows inserted or deleted meanwhile never shift items between pages. The key must be a
+unique, indexed column (the primary key, or e.g. auth_user.username).
+"""
+from urllib.parse import urlencode
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+class KeysetPage:
+    """ One page of results plus the query strings of its neighbouring pages """
+
+    def __init__(self, items, per_page, next_cursor, previous_cursor, params):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query(self, **cursor):
+        params = {key: value for key, value in self._params.items() if key not in ('after', 'before')}
+        params.update(cursor)
+        return '?' + urlencode(params)
+
+    @property
+    def next_query(self):
+        return self._query(after=self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._query(before=self.previous_cursor) if self.has_previous else ''
+
+
+def keyset_paginate(queryset, request, key='id', cursor_type=int, default_per_page=DEFAULT_PER_PAGE, max_per_page=MAX_PER_PAGE):
+    """
+    Returns the KeysetPage of queryset selected by the request's `after`/`before` cursor
+    and `per_page` parameters. Fetches one extra row to know whether another page exists;
+    prefetch_related on queryset only runs for the rows of this page.
+    """
+    try:
+        per_page = int(request.GET.get('per_page', default_per_page))
+    except ValueError:
+        per_page = default_per_page
+    per_page = max(1, min(per_page, max_per_page))
+
+    def parse(value):
+        try:
+            return cursor_type(value) if value not in (None, '') else None
+        except ValueError:
+            return None
+
+    after = parse(request.GET.get('after'))
+    before = parse(request.GET.get('before'))
+
+    if before is not None:
+        rows = list(queryset.filter(**{f'{key}__lt': before}).order_by(f'-{key}')[:per_page + 1])
+        has_previous = len(rows) > per_page
+        items = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            queryset = queryset.filter(**{f'{key}__gt': after})
+        rows = list(queryset.order_by(key)[:per_page + 1])
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_previous = after is not None
+
+    params = {name: value for name, value in request.GET.items()}
+    if 'per_page' in request.GET:
+        params['per_page'] = per_page
+    return KeysetPage(
+        items=items,
+        per_page=per_page,
+        next_cursor=getattr(items[-1], key) if has_next and items else None,
+        previous_cursor=getattr(items[0], key) if has_previous and items else None,
+        params=params,
+    )
@@ -0,0 +1,214 @@
+"""
+Compiled, read-only snapshots of test content for the quiz-taking views.
+
+A CompiledTest holds everything take_question, finish_test and test_results need
+about a Test (ordered questions, answer texts, correct answer IDs, image URLs) as
+plain immutable tuples. It is built once per Test.content_version and kept in a
+bounded per-process LRU, optionally backed by the Django cache so other workers
+can reuse it. Saving or deleting a Test, Question or Answer bumps the test's
+content_version, which makes every cached copy of the old version unreachable.
+
+The cached test list fragment is keyed by a catalogue version derived from the tests'
+content versions and positions (see get_catalogue_version).
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Test, Question, Answer, answer_slots_to_mask, deleted_with
+# Importing images first also registers its post_save receiver before the ones below, so
+# image variants are stored before the content_version bump that invalidates compiled tests
+from .images import image_data
+
+
+class CompiledAnswer(namedtuple('CompiledAnswer', ['id', 'text', 'is_correct', 'slot'])):
+    __slots__ = ()
+
+    def __str__(self):
+        return self.text
+
+
+class CompiledQuestion(namedtuple('CompiledQuestion', ['id', 'text', 'explanation', 'image_url', 'image', 'answers', 'correct_ids', 'correct_mask'])):
+    __slots__ = ()
+
+    @property
+    def correct_answers(self):
+        return [answer for answer in self.answers if answer.is_correct]
+
+    def answers_for_ids(self, answer_ids):
+        """ Returns the compiled answers matching answer_ids, in display order """
+        answer_ids = set(answer_ids)
+        return [answer for answer in self.answers if answer.id in answer_ids]
+
+    def answers_for_mask(self, mask):
+        """ Returns the compiled answers whose slots are set in mask, in display order """
+        return [answer for answer in self.answers if mask >> answer.slot & 1]
+
+    def mask_for_ids(self, answer_ids):
+        """ Packs the given answer IDs of this question into a selection bitmask """
+        return answer_slots_to_mask(answer.slot for answer in self.answers_for_ids(answer_ids))
+
+
+class CompiledTest(namedtuple('CompiledTest', ['id', 'version', 'name', 'test_type', 'questions', 'questions_by_id'])):
+    __slots__ = ()
+
+    def get_question(self, question_id):
+        return self.questions_by_id.get(question_id)
+
+    def questions_for_ids(self, question_ids):
+        """ Returns the compiled questions for question_ids in that order, skipping deleted ones """
+        return [self.questions_by_id[qid] for qid in question_ids if qid in self.questions_by_id]
+
+
+def compile_test(test):
+    """ Builds a CompiledTest from the database (two queries) """
+    answers_by_question = {}
+    for answer in Answer.objects.filter(question__test=test).order_by('id').values('id', 'question_id', 'text', 'is_correct', 'slot'):
+        answers_by_question.setdefault(answer['question_id'], []).append(
+            CompiledAnswer(answer['id'], answer['text'], answer['is_correct'], answer['slot'])
+        )
+
+    questions = []
+    for question in Question.objects.filter(test=test).order_by('id'):
+        answers = tuple(answers_by_question.get(question.id, ()))
+        questions.append(CompiledQuestion(
+            id=question.id,
+            text=question.text,
+            explanation=question.explanation,
+            image_url=question.image.url if question.image else '',
+            image=image_data(question),
+            answers=answers,
+            correct_ids=frozenset(answer.id for answer in answers if answer.is_correct),
+            correct_mask=answer_slots_to_mask(answer.slot for answer in answers if answer.is_correct),
+        ))
+
+    questions = tuple(questions)
+    return CompiledTest(
+        id=test.id,
+        version=test.content_version,
+        name=test.name,
+        test_type=test.test_type,
+        questions=questions,
+        questions_by_id={question.id: question for question in questions},
+    )
+
+
+# --- Per-process LRU ---
+
+_local_cache = OrderedDict()
+_local_lock = threading.Lock()
+
+
+# Bumped whenever the layout of the compiled tuples changes, so other workers never
+# unpickle an incompatible copy from the shared cache
+COMPILED_FORMAT = 2
+
+
+def _shared_cache_key(test_id, version):
+    return f"quiz:compiled_test:v{COMPILED_FORMAT}:{test_id}:{version}"
+
+
+def get_compiled_test(test):
+    """
+    Returns the CompiledTest for test at test.content_version.
+    Checks the local LRU first, then the shared Django cache (if enabled), and only
+    compiles from the database when neither has this version.
+    """
+    with _local_lock:
+        compiled = _local_cache.get(test.id)
+        if compiled is not None and compiled.version == test.content_version:
+            _local_cache.move_to_end(test.id)
+            return compiled
+
+    use_shared_cache = getattr(settings, 'QUIZ_COMPILED_TEST_SHARED_CACHE', False)
+    compiled = None
+    if use_shared_cache:
+        compiled = cache.get(_shared_cache_key(test.id, test.content_version))
+    if compiled is None:
+        compiled = compile_test(test)
+        if use_shared_cache:
+            cache.set(
+                _shared_cache_key(test.id, compiled.version),
+                compiled,
+                getattr(settings, 'QUIZ_COMPILED_TEST_TIMEOUT', 60 * 60 * 24),
+            )
+
+    with _local_lock:
+        _local_cache[test.id] = compiled
+        _local_cache.move_to_end(test.id)
+        while len(_local_cache) > getattr(settings, 'QUIZ_COMPILED_TEST_CACHE_SIZE', 128):
+            _local_cache.popitem(last=False)
+    return compiled
+
+
+def evict_compiled_test(test_id):
+    with _local_lock:
+        _local_cache.pop(test_id, None)
+
+
+# --- Catalogue version ---
+
+def get_catalogue_version():
+    """
+    Returns the current version of the test catalogue (test names, types, order, question counts)
+    as a string, read from the database with one aggregate over the tests. Any edit bumps a test's
+    content_version, reordering changes positions and adding or deleting a test changes the count,
+    so every worker sees a change as soon as it is committed, whatever cache backend is in use.
+    """
+    catalogue = Test.objects.aggregate(
+        tests=Count('id'),
+        versions=Coalesce(Sum('content_version'), 0),
+        # Weighted by ID, so swapping two positions changes the sum
+        order=Coalesce(Sum(F('id') * F('position')), 0),
+    )
+    return '{tests}.{versions}.{order}'.format(**catalogue)
+
+
+# --- Invalidation ---
+
+def bump_content_version(test_ids):
+    """ Marks the content of the given tests as changed so cached copies are rebuilt """
+    Test.objects.filter(id__in=test_ids).update(content_version=F('content_version') + 1)
+
+
+@receiver(post_save, sender=Test)
+def test_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_content_version([instance.id])
+    instance.refresh_from_db(fields=['content_version'])
+
+
+@receiver(post_delete, sender=Test)
+def test_deleted(sender, instance, **kwargs):
+    evict_compiled_test(instance.id)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Questions deleted with their test: test_deleted evicts the compiled test once
+    if raw or deleted_with(origin, Test):
+        return
+    test_ids = {instance.test_id}
+    # A question moved to another test also changes the test it came from
+    loaded_test_id = getattr(instance, '_loaded_test_id', None)
+    if loaded_test_id is not None:
+        test_ids.add(loaded_test_id)
+    instance._loaded_test_id = instance.test_id
+    bump_content_version(test_ids)
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Answers deleted with their question (or test) are covered by the question's own bump
+    if raw or deleted_with(origin, Question, Test):
+        return
+    bump_content_version(Question.objects.filter(id=instance.question_id).values('test_id'))
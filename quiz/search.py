@@ -0,0 +1,223 @@
+"""
+Ranked full-text search over the question bank.
+
+Every question has one search document made of its text, its answers' texts and its
+explanation, stored in a backend-specific index table created by migration 0012:
+
+- SQLite: `quiz_question_fts`, an FTS5 virtual table keyed by rowid = question ID,
+  ranked with bm25() and per-column weights.
+- PostgreSQL: `quiz_question_search`, a weighted tsvector column with a GIN index,
+  ranked with ts_rank_cd(). When nothing matches (typically a misspelled word) and the
+  pg_trgm extension is available, question texts are ranked by trigram word similarity
+  instead, using the `quiz_question_text_trgm` index from migration 0017.
+
+The index is kept in sync by the Question and Answer signal receivers below. Code that
+bypasses signals (bulk_create, queryset.update) must call index_questions() itself.
+Other backends, or an SQLite build without FTS5, fall back to an unindexed
+case-insensitive scan.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.html import strip_tags
+
+from .models import Question, Answer, Test, deleted_with
+
+SQLITE_TABLE = 'quiz_question_fts'
+POSTGRES_TABLE = 'quiz_question_search'
+POSTGRES_CONFIG = 'english'
+
+# bm25() weights for the FTS5 columns (text, answers, explanation)
+SQLITE_WEIGHTS = (10.0, 5.0, 2.0)
+
+# Search terms beyond this are ignored
+MAX_TERMS = 16
+
+POSTGRES_TRIGRAM_INDEX = 'quiz_question_text_trgm'
+
+_index_tables = {}
+_trigram_indexes = {}
+
+
+def index_table():
+    """ Returns the name of the search index table of the current backend, or None if it has none """
+    if connection.alias not in _index_tables:
+        table = {'sqlite': SQLITE_TABLE, 'postgresql': POSTGRES_TABLE}.get(connection.vendor)
+        if table is not None and table not in connection.introspection.table_names():
+            table = None
+        _index_tables[connection.alias] = table
+    return _index_tables[connection.alias]
+
+
+def has_trigram_index():
+    """ True if question texts have a pg_trgm index (PostgreSQL with the extension installed) """
+    if connection.alias not in _trigram_indexes:
+        found = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s', [POSTGRES_TRIGRAM_INDEX])
+                found = cursor.fetchone() is not None
+        _trigram_indexes[connection.alias] = found
+    return _trigram_indexes[connection.alias]
+
+
+def search_terms(query):
+    """ Splits a user query into plain word terms; operators and punctuation are dropped """
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _documents(question_ids):
+    """ Yields (question_id, text, answers, explanation) with HTML stripped, for indexing """
+    answers = {}
+    for question_id, text in Answer.objects.filter(question_id__in=question_ids).order_by('slot').values_list('question_id', 'text'):
+        answers.setdefault(question_id, []).append(text)
+    for question_id, text, explanation in Question.objects.filter(id__in=question_ids).values_list('id', 'text', 'explanation'):
+        yield question_id, strip_tags(text), '\n'.join(answers.get(question_id, [])), strip_tags(explanation)
+
+
+def clear_index():
+    """ Drops every search document, before a full rebuild """
+    table = index_table()
+    if table is not None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table}')
+
+
+def remove_questions(question_ids):
+    """ Drops the search documents of the given questions """
+    table = index_table()
+    question_ids = list(question_ids)
+    if table is None or not question_ids:
+        return
+    key = 'rowid' if table == SQLITE_TABLE else 'question_id'
+    placeholders = ', '.join(['%s'] * len(question_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {key} IN ({placeholders})', question_ids)
+
+
+def index_questions(question_ids):
+    """ (Re)builds the search documents of the given questions; missing questions are removed """
+    table = index_table()
+    question_ids = list(question_ids)
+    if table is None or not question_ids:
+        return
+    remove_questions(question_ids)
+    documents = list(_documents(question_ids))
+    if not documents:
+        return
+    with connection.cursor() as cursor:
+        if table == SQLITE_TABLE:
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, text, answers, explanation) VALUES (%s, %s, %s, %s)', documents
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {table} (question_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('{POSTGRES_CONFIG}', %s), 'A') || "
+                f"setweight(to_tsvector('{POSTGRES_CONFIG}', %s), 'B') || "
+                f"setweight(to_tsvector('{POSTGRES_CONFIG}', %s), 'C'))",
+                documents,
+            )
+
+
+def search_questions(query, test_id=None, limit=100):
+    """
+    Returns the IDs of up to limit questions matching every term of query, best match first.
+    The last term matches as a prefix, so partially typed words already find results.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    table = index_table()
+    test_filter = 'AND q.test_id = %s' if test_id is not None else ''
+    test_params = [test_id] if test_id is not None else []
+
+    if table == SQLITE_TABLE:
+        match = ' '.join(f'"{term}"' for term in terms) + '*'
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        sql = (
+            f'SELECT f.rowid FROM {table} f JOIN quiz_question q ON q.id = f.rowid '
+            f'WHERE {table} MATCH %s {test_filter} '
+            f'ORDER BY bm25({table}, {weights}) LIMIT %s'
+        )
+        params = [match, *test_params, limit]
+    elif table == POSTGRES_TABLE:
+        tsquery = ' & '.join(terms) + ':*'
+        sql = (
+            f"SELECT s.question_id FROM {table} s JOIN quiz_question q ON q.id = s.question_id, "
+            f"to_tsquery('{POSTGRES_CONFIG}', %s) query "
+            f"WHERE s.document @@ query {test_filter} "
+            f"ORDER BY ts_rank_cd(s.document, query) DESC, s.question_id LIMIT %s"
+        )
+        params = [tsquery, *test_params, limit]
+    else:
+        # No index on this backend: every term must appear somewhere in the question
+        questions = Question.objects.all()
+        if test_id is not None:
+            questions = questions.filter(test_id=test_id)
+        for term in terms:
+            questions = questions.filter(
+                Q(text__icontains=term) | Q(explanation__icontains=term) | Q(answers__text__icontains=term)
+            )
+        return list(questions.distinct().order_by('id').values_list('id', flat=True)[:limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        question_ids = [row[0] for row in cursor.fetchall()]
+        if not question_ids and table == POSTGRES_TABLE and has_trigram_index():
+            # No exact word matched: rank question texts containing similar words (typos)
+            words = ' '.join(terms)
+            cursor.execute(
+                f'SELECT q.id FROM quiz_question q WHERE %s <%% q.text {test_filter} '
+                f'ORDER BY word_similarity(%s, q.text) DESC, q.id LIMIT %s',
+                [words, *test_params, words, limit],
+            )
+            question_ids = [row[0] for row in cursor.fetchall()]
+        return question_ids
+
+
+def prefix_search(queryset, prefix, *fields):
+    """
+    Filters queryset to rows where any of fields starts with prefix, ignoring case.
+    Written as `lower(field) >= prefix AND lower(field) < next_prefix` so each field is a
+    range scan on a lower(field) expression index (see migration 0013 for auth_user),
+    unlike icontains, which has to read every row.
+    """
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return queryset
+    # Smallest string greater than every string starting with prefix
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    condition = Q()
+    for field in fields:
+        alias = f'{field}_lower'
+        queryset = queryset.alias(**{alias: Lower(field)})
+        condition |= Q(**{f'{alias}__gte': prefix, f'{alias}__lt': upper})
+    return queryset.filter(condition)
+
+
+# --- Index maintenance ---
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_questions([instance.id])
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    remove_questions([instance.id])
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def answer_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # Answers deleted with their question (or test): question_deleted drops the whole document
+    if raw or deleted_with(origin, Question, Test):
+        return
+    index_questions([instance.question_id])
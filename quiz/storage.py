@@ -0,0 +1,73 @@
+"""
+Content-addressed file storage for question images.
+
+Files are named after the SHA-256 of their bytes, sharded by the first two hex digits:
+
+    question_images/3f/3f9a...c2.png
+    question_images/variants/a1/a1b4...07.webp
+
+Saving bytes that are already stored returns the existing name without writing anything,
+so re-uploading an image (or regenerating identical variants) never creates a copy. A
+file's name changes whenever its content does, so its URL can be cached forever.
+
+Nothing here deletes files: several questions may share a blob, so unreferenced blobs are
+removed by the `gc_media` management command instead.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+
+HASH_CHUNK_SIZE = 64 * 1024
+CONTENT_HASH_LENGTH = 64
+
+_hashed_name = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{%d}(\.[0-9a-z]+)?$' % CONTENT_HASH_LENGTH)
+
+
+def content_hash(content):
+    """ Returns the SHA-256 hex digest of a File's content, leaving it rewound """
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """ FileSystemStorage that names files by content hash and stores each content once """
+
+    def content_name(self, name, content):
+        """ Returns the storage name for content requested under name: same directory, hashed file name """
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        digest = content_hash(content)
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def is_content_addressed(self, name):
+        """ True if name was produced by content_name (i.e. its URL is immutable) """
+        directory, filename = posixpath.split(name)
+        return bool(_hashed_name.match(posixpath.basename(directory) + '/' + filename))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Same bytes already stored: reuse the blob, refreshing its modification time so
+            # a concurrent gc_media sweep (which spares recent files) doesn't delete it
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def question_image_storage():
+    """ Storage of Question.image, configured as STORAGES['question_images'] """
+    return storages['question_images']
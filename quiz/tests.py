@@ -1,3 +1,1035 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.db.models import F, QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from .grading import grade_attempt, load_selections, record_answer, record_answers
+from .importers import (
+    ImportRecordError, QuestionRecord, _iter_json_array, import_questions, open_text, parse_csv, parse_gift, parse_json,
+)
+from .management.commands.gc_media import variant_names
+from .models import (
+    POSITION_GAP, Test, Question, Answer, TestAttempt, TestStatistics, UserAnswer, UserProfile, _longest_increasing_run,
+    answer_slots_to_mask, mask_to_answer_slots,
+)
+from .pagination import DEFAULT_PER_PAGE, MAX_PER_PAGE, keyset_paginate
+from .quiz_cache import compile_test, get_catalogue_version, get_compiled_test
+from .search import index_table, search_questions
+from .storage import question_image_storage
+from .views import release_token, user_list_queryset
+
+# Pages render {% static %} without a collectstatic manifest in tests
+PLAIN_STATIC_FILES = {
+    **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+# --- Compiled test cache ---
+
+class CompiledTestInvalidationTests(TestCase):
+
+    def setUp(self):
+        self.first = Test.objects.create(name='First')
+        self.second = Test.objects.create(name='Second')
+        self.question = Question.objects.create(test=self.first, text='Moving')
+        self.answers = [Answer.objects.create(question=self.question, text=f'A{i}', is_correct=(i == 0)) for i in range(3)]
+
+    def compiled(self, test):
+        return get_compiled_test(Test.objects.get(id=test.id))
+
+    def test_answer_delete_invalidates_its_test(self):
+        self.assertEqual(len(self.compiled(self.first).get_question(self.question.id).answers), 3)
+        self.answers[2].delete()
+        self.assertEqual(len(self.compiled(self.first).get_question(self.question.id).answers), 2)
+
+    def test_moved_question_leaves_its_old_test(self):
+        self.assertEqual(len(self.compiled(self.first).questions), 1)
+        self.assertEqual(len(self.compiled(self.second).questions), 0)
+        question = Question.objects.get(id=self.question.id)
+        question.test = self.second
+        question.save()
+        self.assertEqual(len(self.compiled(self.first).questions), 0)
+        self.assertEqual(len(self.compiled(self.second).questions), 1)
+
+    def test_cascade_deletes_bump_once(self):
+        for i in range(5):
+            question = Question.objects.create(test=self.first, text=f'Q{i}')
+            Answer.objects.bulk_create(Answer(question=question, text=f'A{j}', slot=j) for j in range(4))
+        # Deleting the test: no content version bumps for its rows at all
+        with CaptureQueriesContext(connection) as ctx:
+            Test.objects.get(id=self.first.id).delete()
+        self.assertFalse([query for query in ctx.captured_queries if query['sql'].startswith('UPDATE "quiz_test"')])
+
+        # Deleting a question: one bump for its test, none for its answers
+        question = Question.objects.create(test=self.second, text='Q')
+        Answer.objects.bulk_create(Answer(question=question, text=f'A{j}', slot=j) for j in range(4))
+        with CaptureQueriesContext(connection) as ctx:
+            question.delete()
+        self.assertEqual(len([query for query in ctx.captured_queries if query['sql'].startswith('UPDATE "quiz_test"')]), 1)
+
+
+
+@override_settings(STORAGES=PLAIN_STATIC_FILES)
+class CatalogueVersionTests(TestCase):
+
+    def setUp(self):
+        self.tests = [Test.objects.create(name=f'Catalogue {i}') for i in range(3)]
+
+    def test_changes_move_the_version(self):
+        seen = {get_catalogue_version()}
+
+        def assert_new_version():
+            version = get_catalogue_version()
+            self.assertNotIn(version, seen)
+            seen.add(version)
+
+        self.tests[0].name = 'Renamed'
+        self.tests[0].save()
+        assert_new_version()
+        Question.objects.create(test=self.tests[1], text='Q')
+        assert_new_version()
+        # Swapping two tests keeps the same set of positions
+        Test.apply_order([self.tests[1].id, self.tests[0].id, self.tests[2].id])
+        assert_new_version()
+        Test.objects.create(name='Added')
+        assert_new_version()
+        self.tests[2].delete()
+        assert_new_version()
+
+    def test_list_sees_changes_made_by_other_workers(self):
+        self.client.force_login(User.objects.create_user('student', password='pw'))
+        self.assertContains(self.client.get(reverse('test_list')), 'Catalogue 0')
+        # Another worker's edit only reaches this one through the database
+        Test.objects.filter(id=self.tests[0].id).update(name='Edited elsewhere', content_version=F('content_version') + 1)
+        self.assertContains(self.client.get(reverse('test_list')), 'Edited elsewhere')
+
+
+# --- Grading ---
+
+class MaskGradingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pw')
+        cls.test = Test.objects.create(name='Grading', test_type='exam')
+        # Single answer question: slot 0 is correct
+        cls.single = Question.objects.create(test=cls.test, text='Single')
+        cls.single_answers = [
+            Answer.objects.create(question=cls.single, text=f'S{i}', is_correct=(i == 0)) for i in range(4)
+        ]
+        # Multiple answer question: slots 0 and 2 are correct
+        cls.multiple = Question.objects.create(test=cls.test, text='Multiple')
+        cls.multiple_answers = [
+            Answer.objects.create(question=cls.multiple, text=f'M{i}', is_correct=(i in (0, 2))) for i in range(4)
+        ]
+
+    def setUp(self):
+        self.attempt = TestAttempt.objects.create(
+            user=self.user, test=self.test, question_ids=TestAttempt.snapshot_question_ids(self.test)
+        )
+        self.compiled = compile_test(Test.objects.get(id=self.test.id))
+
+    def test_masks_round_trip(self):
+        self.assertEqual(answer_slots_to_mask([0, 2, 5]), 0b100101)
+        self.assertEqual(mask_to_answer_slots(0b100101), [0, 2, 5])
+        self.assertEqual(answer_slots_to_mask([]), 0)
+
+    def test_correct_masks_follow_answers(self):
+        self.assertEqual(self.compiled.get_question(self.single.id).correct_mask, 0b0001)
+        self.assertEqual(self.compiled.get_question(self.multiple.id).correct_mask, 0b0101)
+        self.single_answers[1].is_correct = True
+        self.single_answers[1].save()
+        self.assertEqual(Question.objects.get(id=self.single.id).correct_mask, 0b0011)
+
+        self.single_answers[0].delete()
+        self.assertEqual(Question.objects.get(id=self.single.id).correct_mask, 0b0010)
+
+    def test_cascade_deletes_skip_the_mask_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            Question.objects.get(id=self.multiple.id).delete()
+        self.assertFalse([query for query in ctx.captured_queries if query['sql'].startswith('UPDATE "quiz_question"')])
+
+    def test_mask_answers(self):
+        UserAnswer.objects.create(test_attempt=self.attempt, question=self.single, selected_mask=0b0001)
+        # Only one of the two correct answers selected
+        UserAnswer.objects.create(test_attempt=self.attempt, question=self.multiple, selected_mask=0b0001)
+
+        self.assertEqual(grade_attempt(self.attempt, self.compiled), (1, 2))
+        self.assertEqual(
+            dict(UserAnswer.objects.filter(test_attempt=self.attempt).values_list('question_id', 'is_correct')),
+            {self.single.id: True, self.multiple.id: False},
+        )
+
+    def test_legacy_m2m_answers(self):
+        # Answers recorded before selected_mask existed keep their selection in the M2M table
+        single = UserAnswer.objects.create(test_attempt=self.attempt, question=self.single, selected_mask=None)
+        single.selected_answers.set([self.single_answers[1]])
+        multiple = UserAnswer.objects.create(test_attempt=self.attempt, question=self.multiple, selected_mask=None)
+        multiple.selected_answers.set([self.multiple_answers[0], self.multiple_answers[2]])
+
+        selections = load_selections(self.attempt)
+        self.assertEqual(selections[self.multiple.id][1], {self.multiple_answers[0].id, self.multiple_answers[2].id})
+        self.assertEqual(grade_attempt(self.attempt, self.compiled, selections), (1, 2))
+        self.assertEqual(
+            dict(UserAnswer.objects.filter(test_attempt=self.attempt).values_list('question_id', 'is_correct')),
+            {self.single.id: False, self.multiple.id: True},
+        )
+
+    def test_unanswered_questions_count_as_incorrect(self):
+        UserAnswer.objects.create(test_attempt=self.attempt, question=self.single, selected_mask=0b0001)
+        self.assertEqual(grade_attempt(self.attempt, self.compiled), (1, 2))
+
+
+class RecordAnswerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pw')
+        cls.test = Test.objects.create(name='Answers', test_type='exam')
+        cls.questions = [Question.objects.create(test=cls.test, text=f'Q{i}') for i in range(2)]
+        cls.answers = {
+            question.id: [Answer.objects.create(question=question, text=f'A{j}', is_correct=(j == 0)) for j in range(3)]
+            for question in cls.questions
+        }
+
+    def setUp(self):
+        self.attempt = TestAttempt.objects.create(
+            user=self.user, test=self.test, question_ids=TestAttempt.snapshot_question_ids(self.test)
+        )
+        self.question = self.questions[0]
+
+    def stored(self, question):
+        return UserAnswer.objects.filter(test_attempt=self.attempt, question=question).values_list('selected_mask', 'is_correct').get()
+
+    def test_insert_update_and_unchanged(self):
+        with self.assertNumQueries(4): # Read, then the INSERT in a savepoint
+            record_answer(self.attempt, self.question.id, 0b001)
+        with self.assertNumQueries(2): # Read, UPDATE
+            record_answer(self.attempt, self.question.id, 0b010, is_correct=True)
+        with self.assertNumQueries(1): # Read only
+            record_answer(self.attempt, self.question.id, 0b010, is_correct=True)
+        self.assertEqual(self.stored(self.question), (0b010, True))
+
+    def test_legacy_answer_is_converted_to_a_mask(self):
+        legacy = UserAnswer.objects.create(test_attempt=self.attempt, question=self.question, selected_mask=None)
+        legacy.selected_answers.set([self.answers[self.question.id][1]])
+        record_answer(self.attempt, self.question.id, 0b100)
+        self.assertEqual(self.stored(self.question), (0b100, False))
+        self.assertFalse(UserAnswer.selected_answers.through.objects.filter(useranswer_id=legacy.id).exists())
+
+    def test_concurrent_insert_becomes_an_update(self):
+        UserAnswer.objects.create(test_attempt=self.attempt, question=self.question, selected_mask=0b001)
+        first = QuerySet.first
+        reads = []
+
+        def first_missing_once(queryset):
+            # The read happens before the other request's INSERT commits
+            reads.append(queryset)
+            return None if len(reads) == 1 else first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', first_missing_once):
+            record_answer(self.attempt, self.question.id, 0b010)
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(self.stored(self.question), (0b010, False))
+
+    def test_other_integrity_errors_are_raised_without_retrying(self):
+        # E.g. a foreign key violation for a question deleted since the test was compiled
+        error = IntegrityError('FOREIGN KEY constraint failed')
+        with mock.patch.object(UserAnswer.objects, 'create', side_effect=error) as create:
+            with self.assertRaises(IntegrityError):
+                record_answer(self.attempt, self.question.id, 0b001)
+        self.assertEqual(create.call_count, 1)
+
+    def test_batch_without_upserts_raises_other_integrity_errors_once(self):
+        compiled = compile_test(Test.objects.get(id=self.test.id))
+        selections = {question.id: [self.answers[question.id][0].id] for question in self.questions}
+        error = IntegrityError('FOREIGN KEY constraint failed')
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(UserAnswer.objects, 'bulk_create', side_effect=error) as bulk_create:
+            with self.assertRaises(IntegrityError):
+                record_answers(self.attempt, compiled, selections)
+        self.assertEqual(bulk_create.call_count, 1)
+
+    def test_batch_without_upserts(self):
+        compiled = compile_test(Test.objects.get(id=self.test.id))
+        UserAnswer.objects.create(test_attempt=self.attempt, question=self.questions[0], selected_mask=0b010)
+        selections = {question.id: [self.answers[question.id][0].id] for question in self.questions}
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.assertEqual(record_answers(self.attempt, compiled, selections), 2)
+            self.assertEqual(record_answers(self.attempt, compiled, selections), 0)
+        self.assertEqual(self.stored(self.questions[0]), (0b001, True))
+        self.assertEqual(self.stored(self.questions[1]), (0b001, True))
+
+
+# --- Single-page exams ---
+
+@override_settings(STORAGES=PLAIN_STATIC_FILES)
+class SinglePageExamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pw')
+        cls.test = Test.objects.create(name='Single page', test_type='exam', delivery='single_page')
+        cls.questions = [Question.objects.create(test=cls.test, text=f'Q{i}') for i in range(2)]
+        cls.answers = {
+            question.id: [Answer.objects.create(question=question, text=f'A{j}', is_correct=(j == 0)) for j in range(3)]
+            for question in cls.questions
+        }
+        other_test = Test.objects.create(name='Other', test_type='exam')
+        cls.foreign_question = Question.objects.create(test=other_test, text='Foreign')
+        cls.foreign_answer = Answer.objects.create(question=cls.foreign_question, text='F', is_correct=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('start_test', args=[self.test.id]))
+        self.attempt = TestAttempt.objects.get(user=self.user, test=self.test, completed=False)
+        self.assertRedirects(response, reverse('take_exam', args=[self.attempt.id]))
+
+    def submit(self, body):
+        return self.client.post(reverse('finish_test', args=[self.attempt.id]), body, content_type='application/json')
+
+    def test_attempt_data_has_no_correctness(self):
+        first, second = self.questions
+        UserAnswer.objects.create(test_attempt=self.attempt, question=first, selected_mask=0b010)
+        legacy = UserAnswer.objects.create(test_attempt=self.attempt, question=second, selected_mask=None)
+        legacy.selected_answers.set([self.answers[second.id][2]])
+
+        response = self.client.get(reverse('attempt_data', args=[self.attempt.id]))
+        data = response.json()
+        self.assertEqual([question['id'] for question in data['questions']], [first.id, second.id])
+        self.assertEqual(set(data['questions'][0]['answers'][0]), {'id', 'text'})
+        self.assertNotIn('correct', response.content.decode())
+        self.assertEqual(data['selections'], {
+            str(first.id): [self.answers[first.id][1].id], str(second.id): [self.answers[second.id][2].id],
+        })
+
+    def test_foreign_questions_and_answers_are_ignored(self):
+        first, second = self.questions
+        response = self.submit({'answers': {
+            first.id: [self.answers[first.id][0].id],
+            # An answer of another question, and a question of another test
+            second.id: [self.answers[first.id][0].id],
+            self.foreign_question.id: [self.foreign_answer.id],
+        }})
+        self.assertEqual(response.json()['redirect_url'], reverse('test_results', args=[self.attempt.id]))
+        self.assertEqual(
+            dict(UserAnswer.objects.filter(test_attempt=self.attempt).values_list('question_id', 'selected_mask')),
+            {first.id: 0b001, second.id: 0},
+        )
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 50.0)
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in ('not json', '[]', '{"answers": [1]}', '{"answers": {"x": [1]}}', '{"answers": {"1": 5}}'):
+            with self.subTest(body=body):
+                response = self.submit(body)
+                self.assertEqual(response.status_code, 400)
+        self.attempt.refresh_from_db()
+        self.assertFalse(self.attempt.completed)
+
+    def test_second_submit_is_not_counted_again(self):
+        body = {'answers': {question.id: [self.answers[question.id][0].id] for question in self.questions}}
+        self.assertEqual(self.submit(body).status_code, 200)
+        self.assertEqual(self.submit(body).status_code, 404)
+        statistics = TestStatistics.objects.get(test=self.test)
+        self.assertEqual((statistics.attempt_count, statistics.completed_count, statistics.score_sum), (1, 1, 100.0))
+
+    def test_concurrent_submit_is_not_counted_again(self):
+        body = {'answers': {question.id: [self.answers[question.id][0].id] for question in self.questions}}
+
+        def finished_meanwhile(test):
+            # A double click's first request completes the attempt after this one loaded it
+            TestAttempt.objects.filter(id=self.attempt.id).update(completed=True, score=100.0)
+            return get_compiled_test(test)
+
+        with mock.patch('quiz.views.get_compiled_test', finished_meanwhile):
+            self.assertEqual(self.submit(body).status_code, 200)
+        self.assertEqual(TestStatistics.objects.get(test=self.test).completed_count, 0)
+
+
+# --- Block status ---
+
+class BlockStatusCacheTests(SimpleTestCase):
+
+    def cache_backend(self, **environ):
+        """ The default cache backend the settings pick in a fresh process with environ """
+        code = 'from django.conf import settings; print(settings.CACHES["default"]["BACKEND"])'
+        env = {name: value for name, value in os.environ.items() if not name.startswith('QUIZ_')}
+        env.update(DJANGO_SETTINGS_MODULE='quiz_project.settings', **environ)
+        return subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout.strip()
+
+    def test_multi_worker_profiles_share_the_cache(self):
+        # A block clears the cached status only in the cache it runs against, so workers must share it
+        self.assertTrue(self.cache_backend(QUIZ_DB_PROFILE='development').endswith('LocMemCache'))
+        self.assertTrue(self.cache_backend(QUIZ_DB_PROFILE='production').endswith('FileBasedCache'))
+        self.assertTrue(self.cache_backend(QUIZ_DB_PROFILE='postgres').endswith('DatabaseCache'))
+        self.assertTrue(self.cache_backend(QUIZ_DB_PROFILE='production', QUIZ_CACHE='database').endswith('DatabaseCache'))
+
+
+class BlockStatusTests(TestCase):
+
+    def test_block_clears_the_status_for_every_worker(self):
+        user = User.objects.create_user('student', password='pw')
+        key = UserProfile.blocked_until_cache_key(user.id)
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            # Another worker process has its own cache client on the same files
+            other_worker = FileBasedCache(location, {})
+            self.assertIsNone(UserProfile.get_blocked_until(user.id))
+            self.assertEqual(other_worker.get(key), (None,))
+
+            profile = UserProfile.objects.get(user=user)
+            profile.blocked_until = timezone.now() + timedelta(days=1)
+            profile.save()
+            self.assertIsNone(other_worker.get(key))
+
+
+# --- Test ordering ---
+
+class LongestIncreasingRunTests(TestCase):
+
+    def test_runs(self):
+        self.assertEqual(_longest_increasing_run([]), set())
+        self.assertEqual(_longest_increasing_run([1, 2, 3]), {0, 1, 2})
+        self.assertEqual(len(_longest_increasing_run([3, 2, 1])), 1)
+        # Strictly increasing: equal values can't both be kept
+        self.assertEqual(len(_longest_increasing_run([5, 5, 5])), 1)
+        self.assertEqual(_longest_increasing_run([10, 1, 20, 2, 30, 3, 4]), {1, 3, 5, 6})
+
+
+class ApplyOrderTests(TestCase):
+
+    def setUp(self):
+        self.tests = [Test.objects.create(name=f'T{i}') for i in range(5)]
+        for i, test in enumerate(self.tests):
+            Test.objects.filter(id=test.id).update(position=(i + 1) * POSITION_GAP)
+
+    def ordered_ids(self):
+        return list(Test.objects.order_by('position').values_list('id', flat=True))
+
+    def positions(self):
+        return dict(Test.objects.values_list('id', 'position'))
+
+    def test_same_order_writes_nothing(self):
+        ids = [test.id for test in self.tests]
+        with self.assertNumQueries(3): # Savepoint, read, release: no UPDATE
+            self.assertEqual(Test.apply_order(ids), 0)
+        self.assertEqual(self.ordered_ids(), ids)
+
+    def test_single_move_rewrites_one_position(self):
+        before = self.positions()
+        ids = [test.id for test in self.tests]
+        ids.insert(1, ids.pop(4))
+        self.assertEqual(Test.apply_order(ids), 1)
+        self.assertEqual(self.ordered_ids(), ids)
+        after = self.positions()
+        self.assertEqual([test_id for test_id in ids if before[test_id] != after[test_id]], [self.tests[4].id])
+
+    def test_full_reversal(self):
+        ids = [test.id for test in reversed(self.tests)]
+        # Only one test can keep its position
+        self.assertEqual(Test.apply_order(ids), len(ids) - 1)
+        self.assertEqual(self.ordered_ids(), ids)
+
+    def test_renumbers_when_gaps_run_out(self):
+        for i, test in enumerate(self.tests):
+            Test.objects.filter(id=test.id).update(position=i)
+        ids = [test.id for test in self.tests]
+        ids.insert(0, ids.pop(2))
+        self.assertEqual(Test.apply_order(ids), len(ids))
+        self.assertEqual(self.ordered_ids(), ids)
+        self.assertEqual(sorted(self.positions().values()), [(i + 1) * POSITION_GAP for i in range(len(ids))])
+
+    def test_unknown_and_duplicate_ids_are_ignored(self):
+        ids = [test.id for test in self.tests]
+        self.assertEqual(Test.apply_order([ids[1], ids[0], ids[1], 999999]), 1)
+        self.assertEqual(self.ordered_ids()[:2], [ids[1], ids[0]])
+
+
+# --- Keyset pagination ---
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [Test.objects.create(name=f'T{i}').id for i in range(7)]
+
+    def page(self, **params):
+        return keyset_paginate(Test.objects.all(), RequestFactory().get('/', params))
+
+    def page_ids(self, page):
+        return [test.id for test in page]
+
+    def test_first_page(self):
+        page = self.page(per_page=3)
+        self.assertEqual(self.page_ids(page), self.ids[:3])
+        self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+        self.assertEqual(page.next_query, f'?per_page=3&after={self.ids[2]}')
+
+    def test_middle_page(self):
+        page = self.page(per_page=3, after=self.ids[2])
+        self.assertEqual(self.page_ids(page), self.ids[3:6])
+        self.assertTrue(page.has_next)
+        self.assertTrue(page.has_previous)
+        # Going back from the middle page returns the first page
+        previous = self.page(per_page=3, before=page.previous_cursor)
+        self.assertEqual(self.page_ids(previous), self.ids[:3])
+        self.assertFalse(previous.has_previous)
+
+    def test_last_page(self):
+        page = self.page(per_page=3, after=self.ids[5])
+        self.assertEqual(self.page_ids(page), self.ids[6:])
+        self.assertFalse(page.has_next)
+        self.assertEqual(page.next_query, '')
+        self.assertEqual(self.page_ids(self.page(per_page=3, after=self.ids[6])), [])
+
+    def test_rows_deleted_meanwhile_dont_shift_pages(self):
+        Test.objects.filter(id=self.ids[3]).delete()
+        self.assertEqual(self.page_ids(self.page(per_page=3, after=self.ids[2])), self.ids[4:7])
+
+    def test_tampered_parameters(self):
+        # A cursor that isn't a key value is ignored, like no cursor at all
+        page = self.page(per_page=3, after='1 OR 1=1')
+        self.assertEqual(self.page_ids(page), self.ids[:3])
+        self.assertFalse(page.has_previous)
+        self.assertEqual(self.page(per_page='many').per_page, DEFAULT_PER_PAGE)
+        self.assertEqual(self.page(per_page=10 ** 6).per_page, MAX_PER_PAGE)
+        self.assertEqual(self.page(per_page=-5).per_page, 1)
+
+
+# --- Question search ---
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        self.test = Test.objects.create(name='Searchable')
+        self.questions = [Question.objects.create(test=self.test, text=f'Routing question {i}') for i in range(3)]
+        for question in self.questions:
+            for j in range(4):
+                Answer.objects.create(question=question, text=f'Answer{j} subnet', is_correct=(j == 0))
+
+    def test_answer_changes_are_indexed(self):
+        question = self.questions[0]
+        self.assertIn(question.id, search_questions('answer3'))
+        question.answers.get(text='Answer3 subnet').delete()
+        self.assertNotIn(question.id, search_questions('answer3'))
+        self.assertIn(question.id, search_questions('routing'))
+
+    def test_cascade_deletes_remove_each_document_once(self):
+        table = index_table()
+        if table is None:
+            self.skipTest("No search index on this backend")
+        with CaptureQueriesContext(connection) as ctx:
+            Test.objects.get(id=self.test.id).delete()
+        index_writes = [query['sql'] for query in ctx.captured_queries if table in query['sql']]
+        # One DELETE per question, and no document rebuilt for its answers
+        self.assertEqual(len(index_writes), len(self.questions))
+        self.assertTrue(all(sql.startswith('DELETE') for sql in index_writes))
+        self.assertEqual(search_questions('routing'), [])
+
+
+# --- Custom admin user list ---
+
+@override_settings(STORAGES=PLAIN_STATIC_FILES)
+class UserListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        User.objects.create_user('alice', 'alice@example.com', 'pw')
+        bob = User.objects.create_user('bob', 'bob@mail.example.org', 'pw')
+        UserProfile.objects.filter(user=bob).update(blocked_until=now + timedelta(days=1))
+        carol = User.objects.create_user('carol', 'carol@example.com', 'pw')
+        UserProfile.objects.filter(user=carol).update(blocked_until=now - timedelta(days=1)) # Block expired
+        User.objects.create_user('dave', 'Dave.Staff@example.com', 'pw', is_staff=True)
+        # Accounts created before profiles existed have none and count as active
+        UserProfile.objects.filter(user=User.objects.create_user('erin', 'erin@example.com', 'pw')).delete()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def usernames(self, **params):
+        response = self.client.get(reverse('custom_admin_users'), params)
+        self.assertEqual(response.status_code, 200)
+        return [user.username for user in response.context['users']]
+
+    def test_status_filters(self):
+        self.assertEqual(self.usernames(), ['admin', 'alice', 'bob', 'carol', 'dave', 'erin'])
+        self.assertEqual(self.usernames(status='staff'), ['admin', 'dave'])
+        self.assertEqual(self.usernames(status='normal'), ['alice', 'bob', 'carol', 'erin'])
+        self.assertEqual(self.usernames(status='blocked'), ['bob'])
+        self.assertEqual(self.usernames(status='active'), ['admin', 'alice', 'carol', 'dave', 'erin'])
+
+    def test_search_matches_prefixes_ignoring_case(self):
+        self.assertEqual(self.usernames(q='AL'), ['alice'])
+        self.assertEqual(self.usernames(q='dave.s'), ['dave'])
+        self.assertEqual(self.usernames(q='bob@mail', status='blocked'), ['bob'])
+        # Prefix search: text in the middle of a username or email doesn't match
+        self.assertEqual(self.usernames(q='lic'), [])
+
+    def test_pages(self):
+        self.assertEqual(self.usernames(per_page=4), ['admin', 'alice', 'bob', 'carol'])
+        self.assertEqual(self.usernames(per_page=4, after='carol'), ['dave', 'erin'])
+        self.assertEqual(self.usernames(per_page=2, before='carol', status='active'), ['admin', 'alice'])
+
+    def test_query_count_does_not_grow_with_users(self):
+        pages = [{}, {'status': 'staff'}, {'status': 'blocked'}, {'status': 'active'}, {'q': 'a', 'status': 'normal'}, {'after': 'bob'}]
+        # Session, logged in user, the page itself
+        for params in pages:
+            with self.subTest(**params), self.assertNumQueries(3):
+                self.client.get(reverse('custom_admin_users'), params)
+
+        User.objects.bulk_create(User(username=f'extra{i:03d}', email=f'extra{i}@example.com') for i in range(120))
+        for params in pages:
+            with self.subTest(**params), self.assertNumQueries(3):
+                self.client.get(reverse('custom_admin_users'), params)
+
+    def test_status_filters_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Plan assertions are written for SQLite")
+
+        def plan(filter_status, search_query=''):
+            return user_list_queryset(filter_status, search_query, timezone.now()).order_by('username')[:51].explain()
+
+        self.assertIn('quiz_auth_user_staff_username', plan('staff'))
+        self.assertIn('quiz_profile_blocked_until', plan('blocked'))
+        self.assertIn('quiz_auth_user_username_lower', plan('all', 'al'))
+        # Read in username order from the unique index, without sorting the whole table
+        for filter_status in ('all', 'active', 'normal'):
+            self.assertNotIn('TEMP B-TREE', plan(filter_status))
+
+
+# --- Question import ---
+
+def parsed(parser, text):
+    """ Runs an import parser over text; returns [(line, answers or error message)] with answers as [(text, is_correct)] """
+    results = []
+    for record, line in parser(io.StringIO(text)):
+        if isinstance(record, ImportRecordError):
+            results.append((line, str(record)))
+        else:
+            results.append((line, record.answers))
+    return results
+
+
+class ImportParserTests(SimpleTestCase):
+
+    def test_csv(self):
+        text = (
+            'Question,Explanation,Answer1,Answer2,Answer3,Correct\n'
+            'Capital of France?,Paris it is,Paris,Lyon,,1\n'
+            '\n'
+            'Primes?,,2,4,5,A;C\n'
+            '"Multi\nline",,yes,no,,b\n'
+            'Broken,,x,y,,4\n'
+            'Letters,,x,y,,Z\n'
+        )
+        records = list(parse_csv(io.StringIO(text)))
+        self.assertEqual(records[0][0].text, 'Capital of France?')
+        self.assertEqual(records[0][0].explanation, 'Paris it is')
+        self.assertEqual(parsed(parse_csv, text), [
+            (2, [('Paris', True), ('Lyon', False)]),
+            (4, [('2', True), ('4', False), ('5', True)]),
+            # A row is numbered by the line it ends on
+            (6, [('yes', False), ('no', True)]),
+            (7, "Correct answer '4' does not exist."),
+            (8, "Correct answer 'Z' does not exist."),
+        ])
+
+    def test_csv_without_required_columns(self):
+        self.assertEqual(parsed(parse_csv, 'question,answer1,answer2\nQ,a,b\n'), [(1, "Missing a `correct` column.")])
+        self.assertEqual(parsed(parse_csv, 'title,correct\nQ,1\n'), [(1, "Missing a `question` column.")])
+        self.assertEqual(parsed(parse_csv, ''), [])
+
+    def test_json_array(self):
+        text = (
+            '[\n'
+            '  {"text": "One", "answers": [{"text": "a", "is_correct": true}, {"text": "b"}]},\n'
+            '  {"question": "Two",\n'
+            '   "answers": [{"text": "c"}, {"text": "d", "is_correct": true}]},\n'
+            '  {"text": "Three", "answers": "none"},\n'
+            '  "not an object"\n'
+            ']\n'
+        )
+        self.assertEqual(parsed(parse_json, text), [
+            (2, [('a', True), ('b', False)]),
+            (3, [('c', False), ('d', True)]),
+            (5, "`answers` must be a list."),
+            (6, "Expected a JSON object."),
+        ])
+
+    def test_json_array_elements_across_buffer_boundaries(self):
+        text = '[{"n": 1}, 12345, {"n": [1, 2, 3]}, 678]'
+        self.assertEqual(
+            [obj for obj, line in _iter_json_array(io.StringIO(text), buffer_size=4)],
+            [{'n': 1}, 12345, {'n': [1, 2, 3]}, 678],
+        )
+
+    def test_malformed_json_array_stops(self):
+        text = '[\n{"text": "One", "answers": [{"text": "a", "is_correct": true}, {"text": "b"}]},\n{"text": oops}\n]'
+        results = parsed(parse_json, text)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0][0], 2)
+        self.assertEqual(results[1], (None, "Invalid JSON near line 3."))
+
+    def test_json_lines(self):
+        text = (
+            '{"text": "One", "answers": [{"text": "a", "is_correct": true}, {"text": "b"}]}\n'
+            '\n'
+            '{"text": "Two", "answers": [{"text": "c", "is_correct": true}, {"text": "d"}]\n'
+            '{"text": 3, "answers": []}\n'
+        )
+        self.assertEqual(parsed(parse_json, text), [
+            (1, [('a', True), ('b', False)]),
+            (3, "Invalid JSON: Expecting ',' delimiter."),
+            (4, "`text` must be a string."),
+        ])
+
+    def test_gift(self):
+        text = (
+            '// A comment\n'
+            '$CATEGORY: $course$/Geography\n'
+            '\n'
+            '::Capital:: What is the capital of France? {\n'
+            '  =Paris #Right\n'
+            '  ~Lyon\n'
+            '  ~Marseille\n'
+            '  ####Paris has been the capital since 987.\n'
+            '}\n'
+            '\n'
+            'Which are primes? {~%50%2 ~%-50%4 ~%50%3}\n'
+            '\n'
+            'Escaped \\{braces\\} and a\\: colon {=yes ~no}\n'
+            '\n'
+            'Is the sky blue? {TRUE}\n'
+        )
+        records = [record for record, line in parse_gift(io.StringIO(text))]
+        self.assertEqual(records[0].text, 'What is the capital of France?')
+        self.assertEqual(records[0].explanation, 'Paris has been the capital since 987.')
+        self.assertEqual(records[2].text, 'Escaped {braces} and a: colon')
+        self.assertEqual(parsed(parse_gift, text), [
+            (4, [('Paris', True), ('Lyon', False), ('Marseille', False)]),
+            (11, [('2', True), ('4', False), ('3', True)]),
+            (13, [('yes', True), ('no', False)]),
+            (15, "Only multiple choice questions ({=right ~wrong}) can be imported."),
+        ])
+
+    def test_gift_without_answers(self):
+        self.assertEqual(parsed(parse_gift, 'Just text\n'), [(1, "Expected an answer block in braces, e.g. {=right ~wrong}.")])
+
+    def test_record_validation(self):
+        invalid = [
+            (QuestionRecord(1, '  ', answers=[('a', True), ('b', False)]), "Question text is empty."),
+            (QuestionRecord(1, 'Q', answers=[('a', True)]), "A question needs at least 2 answers."),
+            (QuestionRecord(1, 'Q', answers=[('a', True), (' ', False)]), "Answer text is empty."),
+            (QuestionRecord(1, 'Q', answers=[('a', False), ('b', False)]), "No answer is marked as correct."),
+        ]
+        for record, message in invalid:
+            with self.subTest(message=message), self.assertRaisesMessage(ImportRecordError, message):
+                record.validate()
+        QuestionRecord(1, 'Q', answers=[('a', True), ('b', False)]).validate()
+
+
+class ImportQuestionsTests(TestCase):
+
+    def test_valid_records_are_written_and_errors_reported(self):
+        test = Test.objects.create(name='Imported')
+        text = (
+            'question,answer1,answer2,answer3,correct\n'
+            'First,a,b,c,2\n'
+            'No correct answer,a,b,,\n'
+            'Second,a,b,c,1;3\n'
+            'Third,a,b,,A\n'
+        )
+        result = import_questions(io.StringIO(text), 'csv', test, chunk_size=2)
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.errors, [(3, "No answer is marked as correct.")])
+
+        second = Question.objects.get(test=test, text='Second')
+        self.assertEqual(second.correct_mask, 0b101)
+        self.assertEqual(list(second.answers.order_by('slot').values_list('slot', 'text', 'is_correct')), [
+            (0, 'a', True), (1, 'b', False), (2, 'c', True),
+        ])
+        # The compiled test cache sees the new questions: one version bump per chunk
+        self.assertEqual(Test.objects.get(id=test.id).content_version, test.content_version + 2)
+
+    def test_dry_run_writes_nothing(self):
+        test = Test.objects.create(name='Dry run')
+        result = import_questions(io.StringIO('question,answer1,answer2,correct\nQ,a,b,1\n'), 'csv', test, dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(test.questions.exists())
+
+    def test_undecodable_file_stops_cleanly_and_keeps_the_cache_current(self):
+        test = Test.objects.create(name='Latin-1')
+        # Cache the empty test, as a student opening it before the import would
+        self.assertEqual(get_compiled_test(Test.objects.get(id=test.id)).questions, ())
+        # Good rows well past the decoder's buffer, then a Latin-1 "é" as saved by Excel
+        rows = ''.join(f'Question {i},a,b,1\n' for i in range(1500))
+        data = b'question,answer1,answer2,correct\n' + rows.encode() + 'Café,a,b,1\n'.encode('latin-1')
+        result = import_questions(open_text(io.BytesIO(data)), 'csv', test, chunk_size=500)
+
+        self.assertTrue(result.stopped)
+        self.assertGreater(result.created, 0)
+        line, message = result.errors[-1]
+        self.assertIsNone(line)
+        self.assertIn("not UTF-8", message)
+        self.assertEqual(test.questions.count(), result.created)
+        # Every committed chunk bumped the version, so the compiled test has all of them
+        compiled = get_compiled_test(Test.objects.get(id=test.id))
+        self.assertEqual(len(compiled.questions), result.created)
+
+    def test_malformed_csv_stops_cleanly(self):
+        test = Test.objects.create(name='Malformed')
+        text = 'question,answer1,answer2,correct\nFirst,a,b,1\nSecond,"%s",b,1\nThird,a,b,1\n' % ('x' * (csv.field_size_limit() + 1))
+        result = import_questions(io.StringIO(text), 'csv', test, chunk_size=1)
+        self.assertTrue(result.stopped)
+        self.assertEqual(result.created, 1)
+        self.assertIn("Import stopped after line 2: Malformed CSV", result.errors[-1][1])
+        self.assertEqual(list(test.questions.values_list('text', flat=True)), ['First'])
+
+    @override_settings(STORAGES=PLAIN_STATIC_FILES)
+    def test_upload_of_undecodable_file_is_reported(self):
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        test = Test.objects.create(name='Upload')
+        upload = SimpleUploadedFile('bank.csv', 'question,answer1,answer2,correct\nCafé,a,b,1\n'.encode('latin-1'))
+        response = self.client.post(reverse('custom_admin_import_questions'), {'test': test.id, 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['result'].stopped)
+        self.assertFalse(test.questions.exists())
+
+
+# --- Data export ---
+
+class ExportDataTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pw')
+        cls.test = Test.objects.create(name='Exported', test_type='exam')
+        cls.questions = [Question.objects.create(test=cls.test, text=f'Question {i}', explanation=f'Because {i}') for i in range(3)]
+        cls.answers = {
+            question.id: [Answer.objects.create(question=question, text=f'A{j}', is_correct=(j in (0, 2))) for j in range(3)]
+            for question in cls.questions
+        }
+        cls.attempt = TestAttempt.objects.create(
+            user=cls.user, test=cls.test, question_ids=[question.id for question in cls.questions]
+        )
+        first, second, third = cls.questions
+        cls.mask_answer = UserAnswer.objects.create(test_attempt=cls.attempt, question=first, selected_mask=0b101, is_correct=True)
+        cls.legacy_answer = UserAnswer.objects.create(test_attempt=cls.attempt, question=second, selected_mask=None)
+        cls.legacy_answer.selected_answers.set([cls.answers[second.id][2], cls.answers[second.id][1]])
+        cls.empty_answer = UserAnswer.objects.create(test_attempt=cls.attempt, question=third, selected_mask=0)
+        # Excluded by --test
+        other_test = Test.objects.create(name='Other')
+        other_question = Question.objects.create(test=other_test, text='Other question')
+        UserAnswer.objects.create(
+            test_attempt=TestAttempt.objects.create(user=cls.user, test=other_test, question_ids=[other_question.id]),
+            question=other_question, selected_mask=0,
+        )
+
+    def export(self, *args):
+        output = io.StringIO()
+        call_command('export_data', *args, '--test', str(self.test.id), '--chunk-size', '2', stdout=output)
+        return output.getvalue()
+
+    def expected_selections(self):
+        first, second, third = self.questions
+        return {
+            self.mask_answer.id: [self.answers[first.id][0].id, self.answers[first.id][2].id],
+            self.legacy_answer.id: [self.answers[second.id][1].id, self.answers[second.id][2].id],
+            self.empty_answer.id: [],
+        }
+
+    def test_answers_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('answers'))))
+        self.assertEqual({int(row['id']): row['selected_answer_ids'] for row in rows}, {
+            answer_id: ';'.join(str(selected_id) for selected_id in selected)
+            for answer_id, selected in self.expected_selections().items()
+        })
+        self.assertEqual({row['attempt_id'] for row in rows}, {str(self.attempt.id)})
+
+    def test_answers_jsonl(self):
+        rows = [json.loads(line) for line in self.export('answers', '--format', 'jsonl').splitlines()]
+        self.assertEqual({row['id']: row['selected_answer_ids'] for row in rows}, self.expected_selections())
+        self.assertEqual(rows[0]['is_correct'], True)
+
+    def test_questions_csv_imports_back(self):
+        copy = Test.objects.create(name='Copy')
+        result = import_questions(io.StringIO(self.export('questions')), 'csv', copy)
+        self.assertEqual((result.created, result.errors), (3, []))
+        self.assertEqual(
+            list(copy.questions.order_by('id').values_list('text', 'explanation', 'correct_mask')),
+            [(f'Question {i}', f'Because {i}', 0b101) for i in range(3)],
+        )
+
+    def test_output_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'attempts.jsonl')
+            self.assertIn("Wrote 1 lines", self.export('attempts', '--format', 'jsonl', '--output', path))
+            with open(path, encoding='utf-8') as exported:
+                self.assertEqual(json.loads(exported.read())['username'], 'student')
+
+
+# --- Media garbage collection ---
+
+def png_bytes(width=400, height=300, color='red'):
+    buffer = io.BytesIO()
+    PILImage.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class GcMediaTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.storage = question_image_storage()
+        self.test = Test.objects.create(name='Images')
+
+    def age(self, *names, hours=48):
+        """ Backdates files past gc_media's minimum age """
+        timestamp = (timezone.now() - timedelta(hours=hours)).timestamp()
+        for name in names:
+            os.utime(self.storage.path(name), (timestamp, timestamp))
+
+    def collect(self, *args):
+        output = io.StringIO()
+        call_command('gc_media', *args, stdout=output)
+        return output.getvalue()
+
+    def test_only_old_unreferenced_files_are_deleted(self):
+        # A question's original and its generated variants
+        question = Question.objects.create(
+            test=self.test, text='Q', image=SimpleUploadedFile('photo.png', png_bytes(color='red')),
+        )
+        question.refresh_from_db()
+        variants = list(variant_names(question.image_variants))
+        self.assertTrue(variants)
+        # Only a completed attempt's results snapshot still shows these two
+        snapshot_image = self.storage.save('question_images/old.png', ContentFile(png_bytes(color='blue')))
+        snapshot_variant = self.storage.save('question_images/variants/old-320w.webp', ContentFile(b'webp'))
+        TestAttempt.objects.create(
+            user=User.objects.create_user('student'), test=self.test, question_ids=[question.id], completed=True,
+            results_snapshot={'results': [{'question': {
+                'image_url': self.storage.url(snapshot_image),
+                'image': {'url': self.storage.url(snapshot_image), 'webp_srcset': f'{self.storage.url(snapshot_variant)} 320w'},
+            }}]},
+        )
+        orphan = self.storage.save('question_images/orphan.png', ContentFile(png_bytes(color='green')))
+        recent_orphan = self.storage.save('question_images/recent.png', ContentFile(png_bytes(color='white')))
+        referenced = [question.image.name, *variants, snapshot_image, snapshot_variant]
+        self.age(*referenced, orphan)
+
+        self.assertIn(f"would delete {orphan}", self.collect('--dry-run'))
+        self.assertTrue(self.storage.exists(orphan))
+
+        self.collect()
+        self.assertFalse(self.storage.exists(orphan))
+        for name in [*referenced, recent_orphan]:
+            self.assertTrue(self.storage.exists(name), name)
+
+
+# --- Conditional page responses ---
+
+@override_settings(STORAGES=PLAIN_STATIC_FILES)
+class PageETagTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pw')
+        cls.test = Test.objects.create(name='Cached pages', test_type='exam')
+        cls.question = Question.objects.create(test=cls.test, text='Q')
+        Answer.objects.create(question=cls.question, text='A', is_correct=True)
+        Answer.objects.create(question=cls.question, text='B', is_correct=False)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def revisit(self, url):
+        """ Loads url, then revisits it with the ETag it was served with; returns (first, second) responses """
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_first_revisit_of_a_question_is_not_modified(self):
+        # A new session has no CSRF cookie yet: the ETag must cover the secret the form was rendered with
+        attempt = TestAttempt.objects.create(user=self.user, test=self.test, question_ids=[self.question.id])
+        first, second = self.revisit(reverse('take_question', args=[attempt.id, 0]))
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_question_edits_keep_results_fresh(self):
+        attempt = TestAttempt.objects.create(
+            user=self.user, test=self.test, question_ids=[self.question.id],
+            completed=True, end_time=timezone.now(), score=100,
+        )
+        first = self.client.get(reverse('test_results', args=[attempt.id]))
+        self.question.text = 'Edited'
+        self.question.save()
+        self.assertGreater(Test.objects.get(id=self.test.id).content_version, self.test.content_version)
+        second = self.client.get(reverse('test_results', args=[attempt.id]), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+        # The test's name is read live, so renaming it changes the page
+        Test.objects.filter(id=self.test.id).update(name='Renamed')
+        third = self.client.get(reverse('test_results', args=[attempt.id]), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+
+    def test_deploys_change_every_etag(self):
+        attempt = TestAttempt.objects.create(
+            user=self.user, test=self.test, question_ids=[self.question.id],
+            completed=True, end_time=timezone.now(), score=100,
+        )
+        url = reverse('test_results', args=[attempt.id])
+        with override_settings(QUIZ_RELEASE='1.0'):
+            first, second = self.revisit(url)
+            self.assertEqual(second.status_code, 304)
+        # Completed results never change otherwise, so only the release can make the old copy stale
+        with override_settings(QUIZ_RELEASE='1.1'):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        # Without a configured release, the templates and static files identify it
+        with override_settings(QUIZ_RELEASE=''):
+            self.assertTrue(release_token())
+            self.assertNotEqual(self.client.get(url)['ETag'], first['ETag'])
+
+
+# --- Query plans ---
+
+class QueryPlanTests(TestCase):
+
+    def test_hot_queries_use_their_indexes(self):
+        output = io.StringIO()
+        call_command('check_query_plans', stdout=output)
+        self.assertNotIn('FAIL', output.getvalue())
+
+    def test_scan_fails_the_check(self):
+        unindexed = [("unindexed filter", UserAnswer.objects.filter(is_correct=True), None)]
+        with mock.patch('quiz.management.commands.check_query_plans.hot_queries', return_value=unindexed):
+            with self.assertRaisesMessage(CommandError, "1 hot-path queries don't use an index."):
+                call_command('check_query_plans', stdout=io.StringIO())
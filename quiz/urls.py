@@ -5,14 +5,18 @@ from .views import (
     signup_view,
 
     # Test Views (User Facing)
-    test_list, start_test, take_question, finish_test, test_results, reorder_tests,
+    test_list, start_test, take_question, take_exam, attempt_data, finish_test, test_results, reorder_tests,
 
     # Custom Admin Views (Questions)
     custom_admin_questions, custom_admin_add_question, custom_admin_edit_question, custom_admin_delete_question,
+    custom_admin_import_questions,
 
     # Custom Admin Views (Tests)
     custom_admin_tests, custom_admin_add_test, custom_admin_edit_test, custom_admin_delete_test,
 
+    # Custom Admin Views (Exports)
+    custom_admin_export,
+
     # Custom Admin Views (Users) - New and existing imports for user management
     custom_admin_users,
     custom_admin_delete_user, custom_admin_block_user, custom_admin_unblock_user,
@@ -31,6 +35,8 @@ urlpatterns = [
     path('tests/reorder/', reorder_tests, name='reorder_tests'),
     path('tests/start/<int:test_id>/', start_test, name='start_test'),
     path('tests/take/<int:attempt_id>/<int:question_index>/', take_question, name='take_question'),
+    path('tests/exam/<int:attempt_id>/', take_exam, name='take_exam'),
+    path('tests/attempt/<int:attempt_id>/data/', attempt_data, name='attempt_data'),
     path('tests/finish/<int:attempt_id>/', finish_test, name='finish_test'),
     path('tests/results/<int:attempt_id>/', test_results, name='test_results'),
 
@@ -45,6 +51,10 @@ urlpatterns = [
     # NEW URL for adding a question directly to a specific Test
     path('admin/tests/<int:test_id>/questions/add/', custom_admin_add_question, name='custom_admin_add_question_to_test'),
 
+    # Bulk import from CSV / JSON / GIFT files
+    path('admin/questions/import/', custom_admin_import_questions, name='custom_admin_import_questions'),
+    path('admin/tests/<int:test_id>/questions/import/', custom_admin_import_questions, name='custom_admin_import_questions_to_test'),
+
     path('admin/questions/edit/<int:question_id>/', custom_admin_edit_question, name='custom_admin_edit_question'),
     path('admin/questions/delete/<int:question_id>/', custom_admin_delete_question, name='custom_admin_delete_question'),
 
@@ -54,6 +64,9 @@ urlpatterns = [
     path('admin/tests/edit/<int:test_id>/', custom_admin_edit_test, name='custom_admin_edit_test'),
     path('admin/tests/delete/<int:test_id>/', custom_admin_delete_test, name='custom_admin_delete_test'),
 
+    # Custom Admin Views (Exports): questions / attempts / answers as CSV or JSON Lines
+    path('admin/export/<str:dataset>/', custom_admin_export, name='custom_admin_export'),
+
     # Custom Admin Views (Users) - Existing and NEW URLs for management actions
     path('admin/users/', custom_admin_users, name='custom_admin_users'),
     path('admin/users/delete/<int:user_id>/', custom_admin_delete_user, name='custom_admin_delete_user'),
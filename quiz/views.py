@@ -5,17 +5,39 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.forms import inlineformset_factory
 from django.urls import reverse
 from django.utils import timezone
-from django.db import transaction
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count # For counting questions (already imported)
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse, Http404
+from django.views.decorators.http import require_safe
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils._os import safe_join
+from django.core.exceptions import SuspiciousFileOperation
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+import functools
+import hashlib
 import json
+import mimetypes
+import os
+import stat
+from pathlib import Path
 
 # Import Django's default User model
 from django.contrib.auth.models import User
 # Import your custom UserProfile model and the forms
-from .models import Test, Question, Answer, TestAttempt, UserAnswer, UserProfile
-from .forms import QuestionForm, AnswerForm, UserAnswerForm, TestForm, UserBlockForm, CustomUserCreationForm
+from .models import Test, Question, Answer, TestAttempt, UserProfile, TestStatistics
+from .forms import QuestionForm, AnswerForm, UserAnswerForm, TestForm, UserBlockForm, CustomUserCreationForm, QuestionImportForm
+from .quiz_cache import get_catalogue_version, get_compiled_test
+from .images import image_data
+from .storage import question_image_storage
+from .pagination import keyset_paginate
+from .search import prefix_search, search_questions
+from .importers import import_questions, open_text
+from .exporters import DATASETS as EXPORT_DATASETS, FORMATS as EXPORT_FORMATS, export_lines
+from .grading import build_results_snapshot, grade_attempt, load_selections, record_answer, record_answers
 
 
 # --- Authentication Views ---
@@ -49,109 +71,208 @@ def test_list(request):
     # --- MODIFIED: Annotate tests with question_count and order by position ---
     tests = Test.objects.annotate(question_count=Count('questions')).order_by('position', 'name')
     # --- END MODIFIED ---
-    return render(request, 'quiz/test_list.html', {'tests': tests})
+    # The card grid is a cached fragment keyed by the catalogue version, so this lazy queryset
+    # only runs when the catalogue changed since it was last rendered
+    return render(request, 'quiz/test_list.html', {
+        'tests': tests,
+        'catalogue_version': get_catalogue_version(),
+        'catalogue_cache_timeout': getattr(settings, 'QUIZ_CATALOGUE_CACHE_TIMEOUT', 60 * 60 * 24),
+    })
+
+
+# --- Media ---
+
+# Content-addressed names change whenever the bytes do, so their responses never go stale
+IMMUTABLE_CACHE_CONTROL = {'public': True, 'max_age': 60 * 60 * 24 * 365, 'immutable': True}
+
+
+@require_safe
+def serve_media(request, path):
+    """ Serves a file below MEDIA_ROOT with ETag/Last-Modified validators, answering revalidations with 304 """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("File not found")
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404("File not found")
+
+    immutable = question_image_storage().is_content_addressed(path)
+    if immutable:
+        # The file name already is the SHA-256 of the content
+        etag = '"%s"' % os.path.splitext(os.path.basename(path))[0]
+    else:
+        etag = '"%x-%x"' % (file_stat.st_mtime_ns, file_stat.st_size)
+    last_modified = int(file_stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    if immutable:
+        patch_cache_control(response, **IMMUTABLE_CACHE_CONTROL)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.QUIZ_MEDIA_MAX_AGE)
+    return response
 
 
 # --- Quiz Taking Views ---
 
+def blocked_user_redirect(request):
+    """ Returns a redirect to the test list if the user is currently blocked, else None """
+    blocked_until = UserProfile.get_blocked_until(request.user.id)
+    if blocked_until and blocked_until > timezone.now():
+        messages.error(request, "You are temporarily blocked from taking tests until " + blocked_until.strftime("%Y-%m-%d %H:%M"))
+        return redirect('test_list') # Redirect back to test list or home
+    return None
+
+@functools.cache
+def _deployed_files_token():
+    """ Hash of the app's templates and the collected static file names, computed once per process """
+    digest = hashlib.sha256()
+    templates = Path(__file__).resolve().parent / 'templates'
+    for path in sorted(templates.rglob('*.html')):
+        digest.update(path.relative_to(templates).as_posix().encode() + b'\0' + path.read_bytes())
+    # Only set by the manifest storage, once collectstatic has run
+    for name, hashed_name in sorted(getattr(staticfiles_storage, 'hashed_files', {}).items()):
+        digest.update(f'{name}={hashed_name}'.encode())
+    return digest.hexdigest()[:16]
+
+def release_token():
+    """ Identifies the deployed release in page ETags: settings.QUIZ_RELEASE, else a hash of templates and static files """
+    return getattr(settings, 'QUIZ_RELEASE', '') or _deployed_files_token()
+
+def page_etag(request, *parts):
+    """
+    Weak ETag for a rendered page built from the values its content depends on, plus what
+    every page shows about the user (username, staff links), the CSRF secret its forms embed
+    and the release, so a deploy that changes templates or static files is never answered with a 304
+    """
+    user = request.user
+    # Creates the CSRF secret now if this is the first visit, so the ETag matches the one the
+    # page is rendered with instead of an empty secret
+    get_token(request)
+    key = ':'.join(str(part) for part in (
+        release_token(), user.id, user.username, user.is_staff, request.META.get('CSRF_COOKIE', ''), *parts
+    ))
+    return 'W/"%s"' % hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def not_modified_response(request, etag):
+    """ Returns a 304 if the browser's copy matches etag, else None. Never when flash messages are waiting to be shown """
+    if len(messages.get_messages(request)):
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_page_validators(response, etag)
+    return response
+
+def set_page_validators(response, etag):
+    """ Makes the browser revalidate the page with its ETag on every visit instead of re-downloading it """
+    response.headers['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 @login_required
 def start_test(request, test_id):
-    # Check if user is blocked via their UserProfile
-    if request.user.userprofile.blocked_until and request.user.userprofile.blocked_until > timezone.now():
-        messages.error(request, "You are temporarily blocked from taking tests until " + request.user.userprofile.blocked_until.strftime("%Y-%m-%d %H:%M"))
-        return redirect('test_list') # Redirect back to test list or home
+    # Check if user is blocked (cached, see UserProfile.get_blocked_until)
+    blocked_response = blocked_user_redirect(request)
+    if blocked_response:
+        return blocked_response
 
     test = get_object_or_404(Test, id=test_id)
 
-    # Create a new test attempt
-    attempt = TestAttempt.objects.create(user=request.user, test=test)
-
-    # Get all questions for this test
-    questions = list(test.questions.all())
+    # Create a new test attempt with its question order frozen up front.
+    # The attempt and its statistics increment commit together, so rebuild_test_statistics
+    # never counts an attempt whose increment is still to come
+    with transaction.atomic():
+        attempt = TestAttempt.objects.create(
+            user=request.user,
+            test=test,
+            question_ids=TestAttempt.snapshot_question_ids(test),
+        )
+        TestStatistics.record_attempt_started(test.id)
+
+    # Single-page exams load every question at once and navigate in the browser
+    if test.is_single_page_exam:
+        return redirect(reverse('take_exam', args=[attempt.id]))
 
     # Redirect to the first question (index 0)
     return redirect(reverse('take_question', args=[attempt.id, 0]))
 
 @login_required
 def take_question(request, attempt_id, question_index):
-    # Check if user is blocked via their UserProfile
-    if request.user.userprofile.blocked_until and request.user.userprofile.blocked_until > timezone.now():
-        messages.error(request, "You are temporarily blocked from taking tests until " + request.user.userprofile.blocked_until.strftime("%Y-%m-%d %H:%M"))
-        return redirect('test_list') # Redirect back to test list or home
+    # Check if user is blocked (cached, see UserProfile.get_blocked_until)
+    blocked_response = blocked_user_redirect(request)
+    if blocked_response:
+        return blocked_response
 
-    attempt = get_object_or_404(TestAttempt, id=attempt_id, user=request.user, completed=False)
+    attempt = get_object_or_404(TestAttempt.objects.select_related('test'), id=attempt_id, user=request.user, completed=False)
     test = attempt.test
-    questions = list(test.questions.all())
-    total_questions = len(questions)
+    question_ids = attempt.get_question_ids()
+    total_questions = len(question_ids)
 
     if question_index >= total_questions:
         # All questions answered, finish the test
         return redirect(reverse('finish_test', args=[attempt.id]))
 
-    current_question = questions[question_index]
-    answers = current_question.answers.all()
-
-    # Check if user has already answered this question in this attempt
-    existing_user_answer = UserAnswer.objects.filter(
-        test_attempt=attempt,
-        question=current_question
-    ).first()
+    # The question page is the same until the test content changes (the form starts unselected),
+    # so a revisit is answered with a 304 before the question is loaded
+    etag = None
+    if request.method == 'GET':
+        etag = page_etag(request, 'take_question', attempt.id, question_index, total_questions, test.content_version)
+        not_modified = not_modified_response(request, etag)
+        if not_modified:
+            return not_modified
+
+    # Question content comes from the compiled test cache, not the database
+    current_question = get_compiled_test(test).get_question(question_ids[question_index])
+    if current_question is None:
+        # Question was deleted after the attempt started, skip over it
+        return redirect(reverse('take_question', args=[attempt.id, question_index + 1]))
+    answers = current_question.answers
 
     if request.method == 'POST':
         # Use the form to handle selected answers
         form = UserAnswerForm(request.POST, question=current_question)
         if form.is_valid():
-            selected_answer_objects = form.cleaned_data['selected_answers']
-            # Extract IDs from Answer objects for comparison
-            selected_answer_ids = [answer.id for answer in selected_answer_objects]
+            selected_mask = current_question.mask_for_ids(form.cleaned_data['selected_answers'])
 
-            # Use a transaction for atomic save
+            # In Learning Mode, determine correctness now to show feedback immediately;
+            # in Exam Mode correctness is determined on finish_test
+            is_correct = (selected_mask == current_question.correct_mask) if test.test_type == 'learning' else False
+
+            # Insert, update in place, or skip the write if the selection is unchanged. The read and
+            # the write share one transaction, which takes the write lock at BEGIN on the production
+            # SQLite profile instead of upgrading a read lock while other students are writing
             with transaction.atomic():
-                # If already answered, update or delete old and create new
-                if existing_user_answer:
-                    existing_user_answer.selected_answers.clear() # Clear previous selection
-                    existing_user_answer.delete() # Or update
-
-                # Create UserAnswer
-                user_answer = UserAnswer.objects.create(
-                    test_attempt=attempt,
-                    question=current_question,
-                    is_correct=False # Will determine correctness on finish for exam mode
-                )
-                user_answer.selected_answers.set(selected_answer_objects) # Add selected answers
-
-                # In Learning Mode, determine correctness and show feedback immediately
-                if test.test_type == 'learning':
-                    # Check if the user's selected answers exactly match the correct answers
-                    correct_answer_ids = set(Answer.objects.filter(question=current_question, is_correct=True).values_list('id', flat=True))
-                    user_selected_ids = set(selected_answer_ids)
-
-                    is_correct = (correct_answer_ids == user_selected_ids)
-                    user_answer.is_correct = is_correct
-                    user_answer.save()
-
-                    # For simplicity, let's render feedback on the same page
-                    context = {
-                        'attempt': attempt,
-                        'question': current_question,
-                        'answers': answers,
-                        'form': form,
-                        'question_index': question_index,
-                        'total_questions': total_questions,
-                        'is_learning_mode': test.test_type == 'learning',
-                        'user_submitted': True, # Flag to show feedback
-                        'user_answer_object': user_answer,
-                        'is_user_correct': is_correct,
-                        'correct_answers': Answer.objects.filter(question=current_question, is_correct=True),
-                    }
-                    # We will add a "Next" button in the template
-                    return render(request, 'quiz/take_question.html', context)
-
-                # In Exam Mode, just save the answer and move to the next question
-                elif test.test_type == 'exam':
-                    # Correctness is determined on finish_test
-                    next_question_index = question_index + 1
-                    return redirect(reverse('take_question', args=[attempt.id, next_question_index]))
+                user_answer = record_answer(attempt, current_question.id, selected_mask, is_correct)
+
+            if test.test_type == 'learning':
+                # For simplicity, let's render feedback on the same page
+                context = {
+                    'attempt': attempt,
+                    'question': current_question,
+                    'answers': answers,
+                    'form': form,
+                    'question_index': question_index,
+                    'total_questions': total_questions,
+                    'is_learning_mode': test.test_type == 'learning',
+                    'user_submitted': True, # Flag to show feedback
+                    'user_answer_object': user_answer,
+                    'is_user_correct': is_correct,
+                    'correct_answers': current_question.correct_answers,
+                }
+                # We will add a "Next" button in the template
+                return render(request, 'quiz/take_question.html', context)
+
+            # In Exam Mode, just save the answer and move to the next question
+            elif test.test_type == 'exam':
+                next_question_index = question_index + 1
+                return redirect(reverse('take_question', args=[attempt.id, next_question_index]))
 
         # If form is invalid, re-render the page with errors
         else:
@@ -181,91 +302,145 @@ def take_question(request, attempt_id, question_index):
             'is_learning_mode': test.test_type == 'learning',
             'user_submitted': False, # No feedback yet
         }
-        return render(request, 'quiz/take_question.html', context)
+        return set_page_validators(render(request, 'quiz/take_question.html', context), etag)
 
 
 @login_required
-def finish_test(request, attempt_id):
-    attempt = get_object_or_404(TestAttempt, id=attempt_id, user=request.user, completed=False)
-    test = attempt.test
-    questions = list(test.questions.all())
-    total_questions = len(questions)
-    correct_count = 0
-
-    # Calculate score if in Exam Mode
-    if test.test_type == 'exam':
-        for question in questions:
-            try:
-                user_answer = UserAnswer.objects.get(test_attempt=attempt, question=question)
-                # Get correct answers for this question
-                correct_answers = set(Answer.objects.filter(question=question, is_correct=True).values_list('id', flat=True))
-                # Get user's selected answers
-                user_selected_answers = set(user_answer.selected_answers.values_list('id', flat=True))
-
-                # User is correct only if their selected answers exactly match the correct ones
-                is_correct = (correct_answers == user_selected_answers)
-
-                # Update the is_correct field on the UserAnswer model for exam mode results display
-                user_answer.is_correct = is_correct
-                user_answer.save()
-
-                if is_correct:
-                    correct_count += 1
-
-            except UserAnswer.DoesNotExist:
-                # User didn't answer this question, it's incorrect
-                pass # correct_count remains the same
-
-        # Calculate score (percentage)
-        if total_questions > 0:
-            score = (correct_count / total_questions) * 100
+def take_exam(request, attempt_id):
+    """ Single-page exam: the page fetches the attempt from attempt_data and submits it to finish_test """
+    # Check if user is blocked (cached, see UserProfile.get_blocked_until)
+    blocked_response = blocked_user_redirect(request)
+    if blocked_response:
+        return blocked_response
+
+    attempt = get_object_or_404(TestAttempt.objects.select_related('test'), id=attempt_id, user=request.user, completed=False)
+    return render(request, 'quiz/take_exam.html', {'attempt': attempt, 'test': attempt.test})
+
+
+@login_required
+def attempt_data(request, attempt_id):
+    """ Returns the whole attempt as JSON: questions, answer choices and saved selections, no correctness data """
+    attempt = get_object_or_404(TestAttempt.objects.select_related('test'), id=attempt_id, user=request.user, completed=False)
+    compiled_test = get_compiled_test(attempt.test)
+
+    saved_selections = {}
+    for question_id, (user_answer, selection) in load_selections(attempt).items():
+        question = compiled_test.get_question(question_id)
+        if question is None:
+            continue
+        if isinstance(selection, int):
+            saved_selections[question_id] = [answer.id for answer in question.answers_for_mask(selection)]
         else:
-            score = 0.0
+            saved_selections[question_id] = [answer.id for answer in question.answers_for_ids(selection)]
+
+    questions = [
+        {
+            'id': question.id,
+            'text': question.text,
+            'image_url': question.image_url,
+            'image': question.image,
+            'answers': [{'id': answer.id, 'text': answer.text} for answer in question.answers],
+        }
+        for question in compiled_test.questions_for_ids(attempt.get_question_ids())
+    ]
+    return JsonResponse({
+        'attempt_id': attempt.id,
+        'test_name': compiled_test.name,
+        'questions': questions,
+        'selections': saved_selections,
+    })
 
-        attempt.score = round(score, 2) # Store score with 2 decimal places
 
-    # Mark attempt as completed
-    attempt.end_time = timezone.now()
-    attempt.completed = True
-    attempt.save()
+@login_required
+def finish_test(request, attempt_id):
+    attempt = get_object_or_404(TestAttempt.objects.select_related('test'), id=attempt_id, user=request.user, completed=False)
+    test = attempt.test
+
+    if request.method == 'POST':
+        # Single-page exam mode submits every answer in one batched JSON POST
+        try:
+            data = json.loads(request.body)
+            selections = {
+                int(question_id): [int(answer_id) for answer_id in answer_ids]
+                for question_id, answer_ids in data.get('answers', {}).items()
+            }
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({'success': False, 'error': 'Invalid answer data'}, status=400)
+    else:
+        selections = None
+
+    compiled_test = get_compiled_test(test)
+
+    # All of the submission's writes in one transaction: one commit instead of one per statement, and
+    # with the production database profile (settings.QUIZ_DB_PROFILE) it starts with BEGIN IMMEDIATE,
+    # so concurrent submissions wait their turn on the busy timeout instead of failing as "database is locked"
+    with transaction.atomic():
+        if selections is not None:
+            record_answers(attempt, compiled_test, selections)
+        selections = load_selections(attempt)
+
+        # Calculate score if in Exam Mode
+        if test.test_type == 'exam':
+            # Grade the attempt's frozen question set (minus any questions deleted since) in bulk
+            correct_count, total_questions = grade_attempt(attempt, compiled_test, selections)
+
+            # Calculate score (percentage)
+            if total_questions > 0:
+                score = (correct_count / total_questions) * 100
+            else:
+                score = 0.0
+
+            attempt.score = round(score, 2) # Store score with 2 decimal places
+
+        # Mark attempt as completed and store its results, which never change from here on
+        attempt.results_snapshot = build_results_snapshot(attempt, compiled_test, selections)
+        attempt.end_time = timezone.now()
+        attempt.completed = True
+        # Only the request that actually flips completed updates the statistics (guards double submits)
+        completed_now = TestAttempt.objects.filter(id=attempt.id, completed=False).update(
+            score=attempt.score,
+            results_snapshot=attempt.results_snapshot,
+            end_time=attempt.end_time,
+            completed=True,
+        )
+        if completed_now:
+            TestStatistics.record_attempt_completed(test.id, attempt.score)
 
     # Redirect to results page
+    if request.method == 'POST':
+        return JsonResponse({'success': True, 'redirect_url': reverse('test_results', args=[attempt.id])})
     return redirect(reverse('test_results', args=[attempt.id]))
 
 
 @login_required
 def test_results(request, attempt_id):
-    attempt = get_object_or_404(TestAttempt, id=attempt_id, user=request.user, completed=True)
+    # The snapshot is only loaded when the page has to be rendered
+    attempt = get_object_or_404(
+        TestAttempt.objects.select_related('test').defer('results_snapshot'), id=attempt_id, user=request.user, completed=True
+    )
     test = attempt.test
-    user_answers = attempt.user_answers.all().select_related('question').prefetch_related('selected_answers', 'question__answers')
-
-    # Collect results data
-    results_data = []
-    for ua in user_answers:
-        question = ua.question
-        correct_answers = Answer.objects.filter(question=question, is_correct=True)
-        selected_answers = ua.selected_answers.all()
 
-        # Determine if the user's selection was exactly correct (needed for exam mode display)
-        correct_ids = set(correct_answers.values_list('id', flat=True))
-        selected_ids = set(selected_answers.values_list('id', flat=True))
-        is_correct_for_display = (correct_ids == selected_ids)
+    # Completed attempts never change, so revisiting the results costs one query and a 304.
+    # Questions come from the snapshot, so question edits (content_version) don't change the page;
+    # only the test's name and type are read live.
+    etag = page_etag(request, 'test_results', attempt.id, attempt.end_time, attempt.score, test.name, test.test_type)
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
 
-
-        results_data.append({
-            'question': question,
-            'user_selected_answers': selected_answers,
-            'correct_answers': correct_answers,
-            'is_user_correct': is_correct_for_display, # Use this for exam mode
-        })
+    # Completed attempts are immutable, so results are rendered from the snapshot taken at finish
+    if attempt.results_snapshot is None:
+        # Attempt completed before snapshots existed: build it once and keep it
+        attempt.results_snapshot = build_results_snapshot(attempt, get_compiled_test(test))
+        attempt.save(update_fields=['results_snapshot'])
 
     context = {
         'attempt': attempt,
         'test': test,
-        'results_data': results_data,
+        'results_data': attempt.results_snapshot['results'],
         'is_learning_mode': test.test_type == 'learning',
     }
-    return render(request, 'quiz/test_results.html', context)
+    return set_page_validators(render(request, 'quiz/test_results.html', context), etag)
 
 
 # --- Custom Admin Views ---
@@ -281,31 +456,52 @@ def reorder_tests(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            test_ids = data.get('test_ids', [])
-            
-            # Update positions for each test
-            for index, test_id in enumerate(test_ids):
-                Test.objects.filter(id=test_id).update(position=index)
-            
+            test_ids = [int(test_id) for test_id in data.get('test_ids', [])]
+
+            # Only tests that actually moved get a new position, in one bulk UPDATE
+            # (the new positions change the catalogue version)
+            Test.apply_order(test_ids)
+
             return JsonResponse({'success': True})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+# Maximum number of ranked matches shown for a question bank search
+SEARCH_RESULT_LIMIT = 100
+
 # --- MODIFIED: custom_admin_questions to handle optional test_id ---
 @user_passes_test(is_staff_check)
 def custom_admin_questions(request, test_id=None): # <--- Added optional test_id parameter
-    questions_queryset = Question.objects.all().select_related('test').prefetch_related('answers')
+    questions_queryset = Question.objects.all().select_related('test', 'item_statistics').prefetch_related('answers')
     test_obj = None # Initialize test_obj to None
 
     if test_id:
         test_obj = get_object_or_404(Test, id=test_id)
         questions_queryset = questions_queryset.filter(test=test_obj) # Filter by the specific test
 
+    search_query = request.GET.get('q', '').strip()
+    if search_query:
+        # Ranked full-text matches (quiz.search), best first; shows the top results only
+        matched_ids = search_questions(search_query, test_id=test_obj.id if test_obj else None, limit=SEARCH_RESULT_LIMIT)
+        matched = questions_queryset.in_bulk(matched_ids)
+        questions = [matched[question_id] for question_id in matched_ids if question_id in matched]
+    else:
+        # One page at a time, ordered by ID; answers are prefetched for the visible page only
+        questions = keyset_paginate(questions_queryset, request)
+    # Attach item analysis selection counts (from `manage.py analyze_items`) to each answer
+    for question in questions:
+        question.image_info = image_data(question)
+        if hasattr(question, 'item_statistics'):
+            for answer in question.answers.all():
+                answer.selection_count = question.item_statistics.selection_counts.get(str(answer.id), 0)
+
     context = {
-        'questions': questions_queryset,
+        'questions': questions,
         'test_obj': test_obj, # Pass the Test object to the template
+        'search_query': search_query,
+        'search_result_limit': SEARCH_RESULT_LIMIT,
     }
     return render(request, 'quiz/custom_admin/questions_list.html', context)
 
@@ -443,31 +639,101 @@ def custom_admin_delete_question(request, question_id):
     })
 
 @user_passes_test(is_staff_check)
-def custom_admin_users(request):
-    filter_status = request.GET.get('status', 'all')
-    search_query = request.GET.get('q', '')
+def custom_admin_import_questions(request, test_id=None):
+    """ Bulk import of questions from an uploaded CSV, JSON/JSON Lines or GIFT file """
+    test_obj = get_object_or_404(Test, id=test_id) if test_id else None
+    result = None
+
+    if request.method == 'POST':
+        form = QuestionImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            test = form.cleaned_data['test']
+            dry_run = form.cleaned_data['dry_run']
+            # The upload is parsed as a stream; large uploads are spooled to a temporary file by Django
+            result = import_questions(
+                open_text(form.cleaned_data['file'].file), form.cleaned_data['file_format'], test, dry_run=dry_run
+            )
+            if dry_run:
+                messages.info(request, f"Dry run: {result.created} valid question(s), {result.error_count} error(s). Nothing was saved.")
+            elif result.created:
+                messages.success(request, f"Imported {result.created} question(s) into {test.name}.")
+            if result.stopped:
+                messages.error(request, "The rest of the file could not be read; see the list below.")
+            elif result.error_count:
+                messages.warning(request, f"{result.error_count} record(s) were skipped; see the list below.")
+    else:
+        form = QuestionImportForm(initial={'test': test_obj} if test_obj else None)
 
-    users_queryset = User.objects.select_related('userprofile').order_by('username')
+    context = {
+        'form': form,
+        'test_obj': test_obj,
+        'result': result,
+    }
+    return render(request, 'quiz/custom_admin/question_import.html', context)
+
+
+@user_passes_test(is_staff_check)
+def custom_admin_export(request, dataset):
+    """
+    Streams an export (questions, attempts or answers) as CSV or JSON Lines.
+    ?format=csv|jsonl (default csv), ?test=<id> (repeatable) limits it to some tests.
+    Rows are sent as they are read, so large exports neither buffer in memory nor time out.
+    """
+    file_format = request.GET.get('format', 'csv')
+    if dataset not in EXPORT_DATASETS or file_format not in EXPORT_FORMATS:
+        raise Http404("Unknown export")
+    try:
+        test_ids = [int(test_id) for test_id in request.GET.getlist('test')]
+    except ValueError:
+        raise Http404("Invalid test ID")
+
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_lines(dataset, file_format, test_ids=test_ids), content_type=f'{content_type}; charset=utf-8')
+    suffix = f"-test-{'-'.join(map(str, test_ids))}" if test_ids else ''
+    filename = f"{dataset}{suffix}-{timezone.now():%Y%m%d-%H%M%S}.{file_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def user_list_queryset(filter_status, search_query, now):
+    """ The users shown by custom_admin_users for a status filter and search text, before pagination """
+    users_queryset = User.objects.select_related('userprofile')
 
     if search_query:
-        users_queryset = users_queryset.filter(username__icontains=search_query) | \
-                         users_queryset.filter(email__icontains=search_query)
+        # Case-insensitive prefix match on username or email, served by lower() expression indexes
+        users_queryset = prefix_search(users_queryset, search_query, 'username', 'email')
 
+    # Each status is a single predicate, so it is applied in the same query as the page
     if filter_status == 'staff':
+        # Served by the partial index on staff usernames (migration 0018)
         users_queryset = users_queryset.filter(is_staff=True)
     elif filter_status == 'normal':
         users_queryset = users_queryset.filter(is_staff=False)
     elif filter_status == 'blocked':
-        users_queryset = users_queryset.filter(userprofile__blocked_until__isnull=False, userprofile__blocked_until__gt=timezone.now())
+        # Range scan on the blocked_until index; the few blocked users are then sorted by username
+        users_queryset = users_queryset.filter(userprofile__blocked_until__gt=now)
     elif filter_status == 'active':
-        users_queryset = users_queryset.filter(userprofile__blocked_until__isnull=True) | \
-                         users_queryset.filter(userprofile__blocked_until__lt=timezone.now()) # not blocked or block expired
+        # The negation of the blocked predicate (no profile, no block or block expired). Almost every user
+        # is active, so the page is read in username index order and stops after per_page + 1 matches
+        users_queryset = users_queryset.exclude(userprofile__blocked_until__gt=now)
+    return users_queryset
+
+@user_passes_test(is_staff_check)
+def custom_admin_users(request):
+    filter_status = request.GET.get('status', 'all')
+    search_query = request.GET.get('q', '')
+    now = timezone.now()
+
+    users_queryset = user_list_queryset(filter_status, search_query, now)
+
+    # One page at a time in username order (username is unique and indexed)
+    users = keyset_paginate(users_queryset, request, key='username', cursor_type=str)
 
     context = {
-        'users': users_queryset,
+        'users': users,
         'filter_status': filter_status,
         'search_query': search_query,
-        'now': timezone.now(), # Pass current time for template logic
+        'now': now, # Pass current time for template logic
     }
     return render(request, 'quiz/custom_admin/users_list.html', context)
 
@@ -478,7 +744,7 @@ def custom_admin_users(request):
 def custom_admin_tests(request):
     """ List all Test types """
     # --- MODIFIED: Annotate tests with question_count ---
-    tests = Test.objects.annotate(question_count=Count('questions')).order_by('name')
+    tests = Test.objects.annotate(question_count=Count('questions')).select_related('statistics').order_by('name')
     # --- END MODIFIED ---
     context = {
         'tests': tests,
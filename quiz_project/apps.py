@@ -0,0 +1,7 @@
+from django.contrib.staticfiles.apps import StaticFilesConfig
+
+
+class QuizStaticFilesConfig(StaticFilesConfig):
+    """ collectstatic without the Tailwind sources: input.css `@import`s a package, not a file,
+    which the manifest storage can't resolve, and only the built output.css is served """
+    ignore_patterns = StaticFilesConfig.ignore_patterns + ['input.css']
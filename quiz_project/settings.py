@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -36,12 +37,16 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    # Let WhiteNoise serve static files under runserver too, so development matches production
+    'whitenoise.runserver_nostatic',
+    'quiz_project.apps.QuizStaticFilesConfig',  # django.contrib.staticfiles, skipping Tailwind sources
     'quiz',  # Custom app for quiz functionality
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Serves collected static files with far-future caching for hashed names and gzip/brotli variants
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -80,6 +85,84 @@ DATABASES = {
     }
 }
 
+# Database profile, chosen with the QUIZ_DB_PROFILE environment variable:
+# 'development' (SQLite as above), 'production' (tuned SQLite) or 'postgres'
+QUIZ_DB_PROFILE = os.environ.get('QUIZ_DB_PROFILE', 'development')
+
+# SQLite tuned for many concurrent exam submissions (benchmark: `manage.py bench_concurrent_writes`).
+# WAL lets readers run alongside the single writer, synchronous=NORMAL is durable across application
+# crashes (a power loss can only drop the last commits), and connections are reused across requests
+# so the pragmas run once per connection instead of once per request.
+QUIZ_SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        # Transactions take the write lock at BEGIN, so one that reads and then writes waits on
+        # the busy timeout instead of failing with "database is locked" when another writer is active
+        'transaction_mode': 'IMMEDIATE',
+        # Seconds a statement waits for the write lock before failing (sqlite3 busy timeout)
+        'timeout': 20,
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=268435456;'  # 256 MB
+            'PRAGMA cache_size=-65536;'  # 64 MB of page cache per connection
+            'PRAGMA temp_store=MEMORY;'
+        ),
+    },
+}
+
+if QUIZ_DB_PROFILE == 'production':
+    DATABASES['default'].update(QUIZ_SQLITE_PRODUCTION)
+elif QUIZ_DB_PROFILE == 'postgres':
+    # PostgreSQL through psycopg 3 (requirements: psycopg[binary,pool]). Copy an existing SQLite
+    # database over with `manage.py migrate` followed by `manage.py copy_from_sqlite`, and create the
+    # cache table (see CACHES below) with `manage.py createcachetable`.
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('QUIZ_PG_NAME', 'quiz'),
+        'USER': os.environ.get('QUIZ_PG_USER', 'quiz'),
+        'PASSWORD': os.environ.get('QUIZ_PG_PASSWORD', ''),
+        'HOST': os.environ.get('QUIZ_PG_HOST', 'localhost'),
+        'PORT': os.environ.get('QUIZ_PG_PORT', '5432'),
+        # Connections come from the pool below and go back to it after every request
+        'CONN_MAX_AGE': 0,
+        # QuerySet.iterator() streams exports and item analysis through server-side cursors;
+        # set QUIZ_PG_DISABLE_CURSORS=1 behind a transaction-pooling PgBouncer, which doesn't support them
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('QUIZ_PG_DISABLE_CURSORS') == '1',
+        'OPTIONS': {
+            # psycopg_pool.ConnectionPool, one per worker process
+            'pool': {
+                'min_size': int(os.environ.get('QUIZ_PG_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('QUIZ_PG_POOL_MAX', 10)),
+                # Seconds a request waits for a free connection before failing
+                'timeout': 10,
+            },
+        },
+    }
+
+# Cache backend, chosen with the QUIZ_CACHE environment variable. Block status, rendered test
+# lists and (optionally) compiled tests are cached, and invalidated in the cache they live in,
+# so every worker process must share it:
+# - 'local': per-process memory; only for a single process such as runserver
+# - 'file': files under QUIZ_CACHE_DIR, shared by all workers of one host (SQLite is single-host)
+# - 'database': the `quiz_cache` table, shared by all hosts; create it with `manage.py createcachetable`
+CACHE_BACKENDS = {
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('QUIZ_CACHE_DIR', BASE_DIR / 'cache'),
+    },
+    'database': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'quiz_cache',
+    },
+}
+QUIZ_CACHE = os.environ.get('QUIZ_CACHE', {'production': 'file', 'postgres': 'database'}.get(QUIZ_DB_PROFILE, 'local'))
+CACHES = {'default': CACHE_BACKENDS[QUIZ_CACHE]}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -116,6 +199,28 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# Target of `collectstatic`, served by WhiteNoise
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Release identifier mixed into page ETags (quiz.views.page_etag), e.g. the deployed commit, so
+# pages cached by browsers are downloaded again after a deploy. When empty, a hash of the quiz
+# templates and collected static file names is used, which misses deploys that only change code.
+QUIZ_RELEASE = os.environ.get('QUIZ_RELEASE', '')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # collectstatic writes content-hashed copies (quiz/css/output.3f9a....css), a manifest and
+    # precompressed .gz/.br files; with DEBUG on, {% static %} keeps the plain names
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+    # Question images and their variants: content-hashed, deduplicated file names (quiz/storage.py)
+    'question_images': {
+        'BACKEND': 'quiz.storage.ContentAddressedStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -126,6 +231,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Settings for uploaded media files (e.g., question images)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Serve MEDIA_ROOT from Django (quiz.views.serve_media, with ETag/Last-Modified and 304s).
+# Turn off when a web server or CDN serves the media directory instead.
+QUIZ_SERVE_MEDIA = True
+# Cache-Control max-age for media files whose names are not content hashes
+QUIZ_MEDIA_MAX_AGE = 60 * 60
+
+
+# Compiled test content cache (see quiz/quiz_cache.py)
+# Number of compiled tests each worker process keeps in memory
+QUIZ_COMPILED_TEST_CACHE_SIZE = 128
+# Also store compiled tests in the Django cache so other workers can reuse them
+QUIZ_COMPILED_TEST_SHARED_CACHE = False
+QUIZ_COMPILED_TEST_TIMEOUT = 60 * 60 * 24
+
+# Seconds the rendered test list is cached per catalogue version. The version is read from the
+# database on every request (quiz_cache.get_catalogue_version), so edits reach every worker at once.
+QUIZ_CATALOGUE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Seconds a user's block status is cached; blocking/unblocking clears it immediately
+# in the shared cache (see CACHES above)
+QUIZ_BLOCK_STATUS_CACHE_TIMEOUT = 300
+
+
+# Session storage, chosen with the QUIZ_SESSION_ENGINE environment variable
+# (benchmark: `manage.py bench_sessions`):
+# - 'db': Django's default, one django_session query per authenticated request
+# - 'cached_db': read from the cache, written through to the database. Needs a shared
+#   cache backend with multiple workers, or a logout in one worker isn't seen by the others
+# - 'signed_cookies': no server-side storage at all. A session can't be revoked before it
+#   expires, and keeping the SECRET_KEY secret becomes what keeps sessions unforgeable
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+QUIZ_SESSION_ENGINE = os.environ.get('QUIZ_SESSION_ENGINE', 'db')
+SESSION_ENGINE = SESSION_ENGINES[QUIZ_SESSION_ENGINE]
 
 
 # Where to redirect after login
@@ -1,12 +1,12 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+import re
 
 # Import necessary views and forms for authentication customization
 from django.contrib.auth.views import LoginView # Import Django's default LoginView
 from quiz.forms import CustomAuthenticationForm # Import your custom form
-from quiz.views import landing_page, signup_view # Import your landing page view and custom signup_view
+from quiz.views import landing_page, signup_view, serve_media # Import your landing page view and custom signup_view
 
 urlpatterns = [
     path('admin/', admin.site.urls), # Default Django admin
@@ -29,6 +29,9 @@ urlpatterns = [
     path('quiz/', include('quiz.urls')),
 ]
 
-# Serve media files during development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Serve uploaded media with conditional GET support (set QUIZ_SERVE_MEDIA = False when a web server/CDN does it).
+# Static files are served by WhiteNoise middleware.
+if settings.QUIZ_SERVE_MEDIA:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]
\ No newline at end of file